@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.settings import Settings, get_settings
+from app.utils.cache import RedisCache, TTLCache, get_cache
+from app.utils.data_version import current_data_version
+
+# Builds the JSON body and extra headers of a response on a cache miss
+Builder = Callable[[], Awaitable[Tuple[bytes, Dict[str, str]]]]
+
+
+def get_response_cache() -> Optional[TTLCache | RedisCache]:
+    settings = get_settings()
+    return get_cache(
+        "api",
+        backend=settings.api_cache_backend,
+        ttl=Settings.parse_duration(settings.api_cache_ttl),
+        maxsize=int(settings.api_cache_maxsize),
+        redis_url=settings.redis_url,
+    )
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag in tags
+
+
+async def cached_json(request: Request, db: AsyncSession, build: Builder) -> Response:
+    """
+    Serve a JSON response through the API cache, with ETag / If-None-Match support.
+
+    Entries are keyed by path, sorted query params and the current data version,
+    so a version bumped by a sync or enrichment batch makes older entries
+    unreachable (they age out by TTL / LRU). The ETag is a hash of the body:
+    a matching If-None-Match gets an empty 304, also when data was rewritten
+    unchanged. Errors raised by `build` are not cached.
+    """
+    cache = get_response_cache()
+    key = None
+    entry = None
+    if cache is not None:
+        version = await current_data_version(db)
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        key = f"{version}:{request.url.path}?{query}"
+        # Redis is a network round trip; keep it off the event loop
+        if cache.backend == "redis":
+            entry = await run_in_threadpool(cache.get, key)
+        else:
+            entry = cache.get(key)
+
+    if entry is None:
+        body, headers = await build()
+        entry = {"body": body.decode(), "etag": _etag(body), "headers": headers}
+        if cache is not None:
+            if cache.backend == "redis":
+                await run_in_threadpool(cache.set, key, entry)
+            else:
+                cache.set(key, entry)
+
+    headers = {**entry["headers"], "ETag": entry["etag"]}
+    if _not_modified(request, entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
@@ -1,84 +1,176 @@
 from __future__ import annotations
 
-from typing import Annotated
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Annotated, AsyncIterator, Dict, Literal, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Select, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.db import SessionLocal
+from app.api.cache import cached_json
+from app.api.projection import dump_csv, dump_ndjson, dump_user, dump_users, users_projection
+from app.db import AsyncSessionLocal
 from app.models import Address, CreditCard, User
 from app.schemas import UserOut
-from app.utils.masking import mask_credit_card
+from app.settings import get_settings
 
 router = APIRouter(prefix="/users", tags=["users"])
 templates = Jinja2Templates(directory="app/templates")
 
 
-def get_db() -> Session:
-    db = SessionLocal()
-    try:
+def get_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    return AsyncSessionLocal
+
+
+async def get_db(
+    sessionmaker: Annotated[async_sessionmaker[AsyncSession], Depends(get_sessionmaker)],
+) -> AsyncIterator[AsyncSession]:
+    async with sessionmaker() as db:
         yield db
-    finally:
-        db.close()
+
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque keyset cursor: the last `users.id` of a page, base64url-encoded JSON."""
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return int(json.loads(raw)["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
 
 
 @router.get("/ui", response_class=HTMLResponse)
-def ui_list_users(request: Request, db: Annotated[Session, Depends(get_db)]):
+async def ui_list_users(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
     """
     Minimal HTML page to browse saved users.
     """
-    users = db.query(User).all()
+    users = (await db.scalars(select(User))).all()
     return templates.TemplateResponse(request, "ui.html", {"users": users})
 
 
 @router.get("", response_model=list[UserOut])
-def list_users(
-    db: Annotated[Session, Depends(get_db)],
+async def list_users(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None, description="Value of a previous X-Next-Cursor header"),
     has_address: bool | None = Query(None),
     has_card: bool | None = Query(None),
 ):
-    query = db.query(User)
+    """
+    List users ordered by `users.id`.
 
-    if has_address is True:
-        query = query.join(Address, Address.user_id == User.id)
-    elif has_card is False:
-        query = query.outerjoin(CreditCard, CreditCard.user_id == User.id).filter(
-            CreditCard.id.is_(None)
-        )
+    Pass the `X-Next-Cursor` response header back as `cursor` to get the next
+    page: keyset pagination (`users.id > last id`) costs the same at any depth
+    and is stable while sync_users writes. `offset` still works but gets slower
+    on deep pages; the header is absent on the last page.
 
-    if has_card is True:
-        query = query.join(CreditCard, CreditCard.user_id == User.id)
-    elif has_card is False:
-        query = query.outerjoin(CreditCard, CreditCard.user_id == User.id).filter(
-            CreditCard.id.is_(None)
-        )
+    Responses are cached until the next committed write batch and carry an ETag.
+    """
+    if cursor is not None and offset:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset, not both")
+    last_id = decode_cursor(cursor) if cursor is not None else None
+
+    async def build() -> Tuple[bytes, Dict[str, str]]:
+        query = users_projection().order_by(User.id.asc())
 
-    query = query.options(joinedload(User.address), joinedload(User.credit_card))
+        if has_address is not None:
+            query = query.where(Address.id.is_not(None) if has_address else Address.id.is_(None))
+        if has_card is not None:
+            query = query.where(CreditCard.id.is_not(None) if has_card else CreditCard.id.is_(None))
 
-    users = query.offset(offset).limit(limit).all()
+        if last_id is not None:
+            query = query.where(User.id > last_id)
+        else:
+            query = query.offset(offset)
 
-    results: list[UserOut] = []
-    for u in users:
-        schema = UserOut.model_validate(u)
-        if schema.credit_card and schema.credit_card.cc_number:
-            schema.credit_card.cc_number = mask_credit_card(schema.credit_card.cc_number)
-        results.append(schema)
-    return results
+        # One extra row tells whether another page exists
+        rows = (await db.execute(query.limit(limit + 1))).all()
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
+        return dump_users(rows), headers
+
+    return await cached_json(request, db, build)
+
+
+async def _export_chunks(
+    sessionmaker: async_sessionmaker[AsyncSession], query: Select, fmt: str
+) -> AsyncIterator[bytes]:
+    """
+    Encoded export chunks, one per EXPORT_BATCH_SIZE rows of a server-side cursor.
+
+    The session lives inside the generator so it stays open while the response
+    streams; only one batch of rows is held in memory at a time.
+    """
+    batch_size = get_settings().export_batch_size
+    async with sessionmaker() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        header = fmt == "csv"
+        async for rows in result.partitions():
+            if fmt == "csv":
+                yield dump_csv(rows, header=header)
+                header = False
+            else:
+                yield dump_ndjson(rows)
+        if header:  # empty export: still send the CSV header
+            yield dump_csv([], header=True)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_users(
+    sessionmaker: Annotated[async_sessionmaker[AsyncSession], Depends(get_sessionmaker)],
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    updated_since: Annotated[
+        datetime | None,
+        Query(description="Only users whose row, address or card changed at or after this time"),
+    ] = None,
+):
+    """
+    Stream every user (ordered by id) as NDJSON (UserOut per line) or CSV, cards masked.
+
+    Rows come from a server-side cursor in EXPORT_BATCH_SIZE batches, so memory
+    stays flat whatever the table size. Use `updated_since` for incremental dumps.
+    Not cached.
+    """
+    query = users_projection().order_by(User.id.asc())
+    if updated_since is not None:
+        query = query.where(
+            or_(
+                User.updated_at >= updated_since,
+                Address.updated_at >= updated_since,
+                CreditCard.updated_at >= updated_since,
+            )
+        )
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_chunks(sessionmaker, query, fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{fmt}"'},
+    )
 
 
 @router.get("/{user_id}", response_model=UserOut)
-def get_user(user_id: int, db: Annotated[Session, Depends(get_db)]):
+async def get_user(user_id: int, request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
     """
     Get a single user by internal ID.
     """
-    user = db.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    schema = UserOut.model_validate(user)
-    if schema.credit_card and schema.credit_card.cc_number:
-        schema.credit_card.cc_number = mask_credit_card(schema.credit_card.cc_number)
-    return schema
+
+    async def build() -> Tuple[bytes, Dict[str, str]]:
+        row = (await db.execute(users_projection().where(User.id == user_id))).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return dump_user(row), {}
+
+    return await cached_json(request, db, build)
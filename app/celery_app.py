@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 from datetime import timedelta
+from typing import Any
 
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 
+from .metrics import instrument_celery
 from .settings import Settings, get_settings
 
 settings: Settings = get_settings()
@@ -16,6 +19,7 @@ celery = Celery(
         "app.tasks.users",
         "app.tasks.addresses",
         "app.tasks.credit_cards",
+        "app.tasks.enrichment",
     ],
 )
 
@@ -27,6 +31,49 @@ celery.conf.accept_content = ["json"]
 celery.conf.result_serializer = "json"
 celery.conf.timezone = "UTC"
 
+if settings.metrics_enabled:
+    instrument_celery(exporter_port=settings.worker_metrics_port)
+
+
+@worker_process_init.connect
+def reset_process_resources(**_: Any) -> None:
+    """
+    Give each forked worker child its own DB pool and provider client.
+
+    The engine and HTTP sessions may have been created in the parent before fork;
+    their sockets must not be shared, so the child drops the inherited pool without
+    closing the parent's connections and rebuilds everything lazily on first use.
+    """
+    from app.clients.dummyjson import get_client, reset_shared_sessions
+    from app.clients.ratelimit import get_limiter
+    from app.db import engine
+    from app.utils.cache import get_cache
+    from app.utils.lock import get_lease
+
+    engine.dispose(close=False)
+    reset_shared_sessions()
+    for factory in (get_client, get_cache, get_limiter, get_lease):
+        factory.cache_clear()
+
+
+@worker_process_shutdown.connect
+def close_process_resources(**_: Any) -> None:
+    """Close pooled DB connections when a worker child exits."""
+    from app.db import engine
+
+    engine.dispose()
+
+
+# Enrichment entries: one batch per tick, or a sharded fan-out of the whole backlog
+if settings.enrich_fanout:
+    enrich_addresses_task = "app.tasks.addresses.enrich_missing_addresses_sharded"
+    enrich_cards_task = "app.tasks.credit_cards.enrich_missing_cards_sharded"
+    enrich_args: tuple = ()
+else:
+    enrich_addresses_task = "app.tasks.addresses.enrich_missing_addresses"
+    enrich_cards_task = "app.tasks.credit_cards.enrich_missing_cards"
+    enrich_args = (settings.batch_size,)
+
 # Beat schedule built from human-friendly env values (e.g. "15m", "1h", "30s")
 celery.conf.beat_schedule = {
     "sync-users": {
@@ -34,13 +81,13 @@ celery.conf.beat_schedule = {
         "schedule": timedelta(seconds=Settings.parse_duration(settings.users_every)),
     },
     "enrich-addresses": {
-        "task": "app.tasks.addresses.enrich_missing_addresses",
+        "task": enrich_addresses_task,
         "schedule": timedelta(seconds=Settings.parse_duration(settings.enrich_addr_every)),
-        "args": (settings.batch_size,),
+        "args": enrich_args,
     },
     "enrich-cards": {
-        "task": "app.tasks.credit_cards.enrich_missing_cards",
+        "task": enrich_cards_task,
         "schedule": timedelta(seconds=Settings.parse_duration(settings.enrich_card_every)),
-        "args": (settings.batch_size,),
+        "args": enrich_args,
     },
 }
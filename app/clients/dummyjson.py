@@ -1,30 +1,127 @@
 from __future__ import annotations
 
 import logging
+import threading
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlencode
 
+import ijson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.clients.ratelimit import AdaptiveLimiter, get_limiter
+from app.metrics import observe_provider_request
+from app.settings import get_settings
+from app.utils.cache import RedisCache, TTLCache, get_cache
 
 logger = logging.getLogger(__name__)
 
+# Statuses retried by the transport (with backoff and Retry-After) before surfacing
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
 
 @dataclass
 class DummyJSONConfig:
     base_url: str
     timeout: int
+    pool_size: int = 10
+    max_retries: int = 3
+    backoff_factor: float = 0.3
+
+
+@dataclass
+class PageStats:
+    """Timing of one streamed list_users page."""
+
+    skip: int
+    users: int
+    seconds: float
+
+
+_sessions: Dict[Tuple[int, int, float], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def _shared_session(config: DummyJSONConfig) -> requests.Session:
+    """
+    Return the process-wide keep-alive session for this transport configuration.
+
+    Sessions are reused across client instances (and therefore across tasks in the
+    same worker process), so TCP/TLS handshakes are paid once per pooled connection.
+    """
+    key = (config.pool_size, config.max_retries, config.backoff_factor)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _build_session(config)
+            _sessions[key] = session
+        return session
+
+
+def reset_shared_sessions() -> None:
+    """
+    Forget pooled sessions inherited from a parent process.
+
+    Called in freshly forked workers: sockets copied from the parent must not be
+    shared, so the child opens its own pool on first use.
+    """
+    global _sessions_lock
+    _sessions_lock = threading.Lock()
+    _sessions.clear()
+
+
+def _build_session(config: DummyJSONConfig) -> requests.Session:
+    retry = Retry(
+        total=config.max_retries,
+        backoff_factor=config.backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.pool_size, pool_maxsize=config.pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(
+        {
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+    )
+    return session
 
 
 class DummyJSONClient:
     """
     Minimal HTTP client for DummyJSON users API.
 
+    Requests go through a pooled keep-alive session shared per process, with
+    gzip and transport-level retries on 429/5xx. An optional cache (in-process
+    or Redis) serves repeated get_user / list_users calls within its TTL, and an
+    optional AdaptiveLimiter paces requests against the provider's shared budget.
+
     Docs: https://dummyjson.com/docs/users
     """
 
-    def __init__(self, config: DummyJSONConfig) -> None:
+    def __init__(
+        self,
+        config: DummyJSONConfig,
+        cache: Optional[TTLCache | RedisCache] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ) -> None:
         self._base = config.base_url.rstrip("/")
         self._timeout = config.timeout
+        self._session = _shared_session(config)
+        self._cache = cache
+        self._limiter = limiter
 
     @classmethod
     def from_settings(cls, settings: Any) -> "DummyJSONClient":
@@ -32,31 +129,177 @@ class DummyJSONClient:
             DummyJSONConfig(
                 base_url=settings.dummyjson_base_url,
                 timeout=int(settings.request_timeout_seconds),
-            )
+                pool_size=int(settings.http_pool_size),
+                max_retries=int(settings.http_max_retries),
+                backoff_factor=float(settings.http_backoff_factor),
+            ),
+            cache=get_cache(
+                "dummyjson",
+                backend=settings.client_cache_backend,
+                ttl=settings.parse_duration(settings.client_cache_ttl),
+                maxsize=int(settings.client_cache_maxsize),
+                redis_url=settings.redis_url,
+            ),
+            limiter=get_limiter(
+                "dummyjson",
+                rate=float(settings.provider_rate_limit),
+                burst=int(settings.provider_rate_burst),
+                max_concurrency=int(settings.provider_max_concurrency),
+                latency_target=settings.provider_latency_target_ms / 1000,
+                redis_url=settings.redis_url,
+            ),
         )
 
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        url = f"{self._base}/{path.lstrip('/')}"
-        resp = requests.get(url, params=params or {}, timeout=self._timeout)
+        resp = self._send(path, params or {})
         resp.raise_for_status()
         return resp.json()
 
+    def _send(self, path: str, params: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """GET `path` through the limiter (if any), recording latency and status."""
+        url = f"{self._base}/{path.lstrip('/')}"
+        if self._limiter is not None:
+            self._limiter.acquire()
+        started = time.perf_counter()
+        resp: Optional[requests.Response] = None
+        try:
+            resp = self._session.get(url, params=params, timeout=self._timeout, stream=stream)
+            return resp
+        finally:
+            latency = time.perf_counter() - started
+            status = resp.status_code if resp is not None else None
+            observe_provider_request("dummyjson", path, status, latency)
+            if self._limiter is not None:
+                self._limiter.release(status, latency, _retried_statuses(resp))
+
+    def limiter_stats(self) -> Dict[str, Any]:
+        return self._limiter.snapshot() if self._limiter is not None else {"rate": None}
+
+    def _stream_users_page(self, params: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+        """
+        Parse a list_users response body incrementally.
+
+        Yields ("user", payload) for each element of `users` as soon as it is
+        complete, and ("total", n) when the `total` key is reached.
+        """
+        resp = self._send("users", params, stream=True)
+        with resp:
+            resp.raise_for_status()
+            resp.raw.decode_content = True
+            builder: Optional[ijson.ObjectBuilder] = None
+            for prefix, event, value in ijson.parse(resp.raw, use_float=True):
+                if builder is not None:
+                    builder.event(event, value)
+                    if prefix == "users.item" and event == "end_map":
+                        yield "user", builder.value
+                        builder = None
+                elif prefix == "users.item" and event == "start_map":
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                elif prefix == "total" and event == "number":
+                    yield "total", int(value)
+
+    def _cached_get(self, path: str, params: Dict[str, Any], use_cache: bool) -> Dict[str, Any]:
+        if self._cache is None or not use_cache:
+            return self._get(path, params=params)
+        key = f"{path}?{urlencode(sorted(params.items()))}"
+        payload = self._cache.get(key)
+        if payload is None:
+            payload = self._get(path, params=params)
+            self._cache.set(key, payload)
+        return payload
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self._cache.stats() if self._cache is not None else {"backend": "none"}
+
+    def connection_stats(self) -> Dict[str, int]:
+        """
+        Requests sent and connections opened by the shared pool (reused = difference).
+        """
+        sent = opened = 0
+        adapters = {id(a): a for a in self._session.adapters.values()}.values()
+        for adapter in adapters:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                sent += pool.num_requests
+                opened += pool.num_connections
+        return {
+            "requests": sent,
+            "connections_opened": opened,
+            "connections_reused": max(sent - opened, 0),
+        }
+
     # -------- API methods --------
 
-    def list_users(self, *, limit: int = 100, skip: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+    def list_users(
+        self,
+        *,
+        limit: int = 100,
+        skip: int = 0,
+        select: Optional[Sequence[str]] = None,
+        use_cache: bool = True,
+    ) -> Tuple[List[Dict[str, Any]], int]:
         """
         Returns (users, total). Supports pagination via limit/skip.
+        `select` limits each user to those top-level fields (plus `id`);
+        `use_cache=False` always goes to the provider.
         """
-        payload = self._get("users", params={"limit": limit, "skip": skip})
+        params = {"limit": limit, "skip": skip, **_select_param(select)}
+        payload = self._cached_get("users", params, use_cache)
         users: List[Dict[str, Any]] = payload.get("users", []) or []
         total: int = int(payload.get("total", len(users)))
         return users, total
 
-    def get_user(self, external_id: int) -> Dict[str, Any]:
-        return self._get(f"users/{external_id}")
+    def iter_users(
+        self,
+        *,
+        page_size: int = 100,
+        skip: int = 0,
+        select: Optional[Sequence[str]] = None,
+        mapper: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        on_page: Optional[Callable[[PageStats], None]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream all users from `skip` onwards, page by page, with bounded memory.
+
+        Each page body is parsed incrementally and every user is yielded (mapped
+        with `mapper`, default `map_user`) as soon as it is parsed, so large page
+        sizes do not load whole pages into memory. `on_page` receives per-page
+        timing. Responses are never cached.
+        """
+        mapper = mapper or self.map_user
+        total: Optional[int] = None
+        while total is None or skip < total:
+            started = time.perf_counter()
+            count = 0
+            params = {"limit": page_size, "skip": skip, **_select_param(select)}
+            for kind, value in self._stream_users_page(params):
+                if kind == "total":
+                    total = value
+                else:
+                    count += 1
+                    yield mapper(value)
+            if on_page is not None:
+                on_page(PageStats(skip=skip, users=count, seconds=time.perf_counter() - started))
+            if count == 0 or (total is None and count < page_size):
+                return
+            skip += count
+
+    def get_user(
+        self, external_id: int, *, select: Optional[Sequence[str]] = None, use_cache: bool = True
+    ) -> Dict[str, Any]:
+        return self._cached_get(f"users/{external_id}", _select_param(select), use_cache)
 
     # -------- Mapping helpers (DummyJSON -> internal dicts for models) --------
 
+    # Top-level fields each mapper reads; pass as `select=` to skip the rest of the payload
+    USER_FIELDS = ("firstName", "lastName", "username", "email", "phone", "domain", "company")
+    ADDRESS_FIELDS = ("address",)
+    CARD_FIELDS = ("bank",)
+    # Shared by both enrichment tasks so one cached payload serves address and card
+    ENRICH_FIELDS = ADDRESS_FIELDS + CARD_FIELDS
+
     @staticmethod
     def map_user(user: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -112,6 +355,28 @@ class DummyJSONClient:
         }
 
 
+@lru_cache(maxsize=None)
+def get_client() -> DummyJSONClient:
+    """Process-wide client: one HTTP pool, response cache and limiter per worker process."""
+    return DummyJSONClient.from_settings(get_settings())
+
+
+def _retried_statuses(resp: Optional[requests.Response]) -> List[int]:
+    """
+    Statuses the transport retried before `resp` (429/5xx hidden from the caller).
+    """
+    retries = getattr(getattr(resp, "raw", None), "retries", None)
+    history = getattr(retries, "history", None) or ()
+    return [h.status for h in history if h.status is not None]
+
+
+def _select_param(select: Optional[Sequence[str]]) -> Dict[str, str]:
+    """
+    Build DummyJSON's `select=a,b` projection parameter (empty when not projecting).
+    """
+    return {"select": ",".join(select)} if select else {}
+
+
 def _parse_mm_yy(value: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
     """
     Parse 'MM/YY' into (month, year), year normalized to 2000+YY.
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+from app.clients.dummyjson import RETRY_STATUSES, DummyJSONClient, DummyJSONConfig, _select_param
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDummyJSONClient:
+    """
+    asyncio variant of DummyJSONClient built on httpx.
+
+    Requests share one keep-alive connection pool and at most `concurrency` are in
+    flight at once, so a single worker slot can fetch hundreds of users in parallel.
+    Retries follow the sync client: connection errors and 429/5xx responses are
+    retried `max_retries` times with `backoff_factor` backoff (or Retry-After).
+    Mapping helpers are the same static methods as on the sync client.
+    """
+
+    map_user = staticmethod(DummyJSONClient.map_user)
+    map_address = staticmethod(DummyJSONClient.map_address)
+    map_credit_card = staticmethod(DummyJSONClient.map_credit_card)
+
+    def __init__(
+        self,
+        config: DummyJSONConfig,
+        *,
+        concurrency: int = 10,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._max_retries = config.max_retries
+        self._backoff_factor = config.backoff_factor
+        self._client = httpx.AsyncClient(
+            base_url=config.base_url.rstrip("/"),
+            timeout=config.timeout,
+            limits=httpx.Limits(
+                max_connections=config.pool_size, max_keepalive_connections=config.pool_size
+            ),
+            transport=transport or httpx.AsyncHTTPTransport(retries=config.max_retries),
+            headers={"Accept": "application/json"},
+        )
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "AsyncDummyJSONClient":
+        return cls(
+            DummyJSONConfig(
+                base_url=settings.dummyjson_base_url,
+                timeout=int(settings.request_timeout_seconds),
+                pool_size=int(settings.http_pool_size),
+                max_retries=int(settings.http_max_retries),
+                backoff_factor=float(settings.http_backoff_factor),
+            ),
+            concurrency=int(settings.enrich_concurrency),
+        )
+
+    async def __aenter__(self) -> "AsyncDummyJSONClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _retry_delay(self, resp: httpx.Response, attempt: int) -> float:
+        """Seconds before retry `attempt`: Retry-After when given, else exponential backoff."""
+        retry_after = resp.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return float(retry_after)
+        return self._backoff_factor * 2**attempt
+
+    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # httpx transport retries cover connection errors only; statuses are retried here
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                resp = await self._client.get(f"/{path.lstrip('/')}", params=params or {})
+            if resp.status_code not in RETRY_STATUSES or attempt >= self._max_retries:
+                break
+            await asyncio.sleep(self._retry_delay(resp, attempt))  # without holding a slot
+            attempt += 1
+        resp.raise_for_status()
+        return resp.json()
+
+    # -------- API methods --------
+
+    async def list_users(
+        self, *, limit: int = 100, skip: int = 0, select: Optional[Sequence[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Returns (users, total). Supports pagination via limit/skip and `select=` projection.
+        """
+        params = {"limit": limit, "skip": skip, **_select_param(select)}
+        payload = await self._get("users", params=params)
+        users: List[Dict[str, Any]] = payload.get("users", []) or []
+        total: int = int(payload.get("total", len(users)))
+        return users, total
+
+    async def get_user(
+        self, external_id: int, *, select: Optional[Sequence[str]] = None
+    ) -> Dict[str, Any]:
+        return await self._get(f"users/{external_id}", params=_select_param(select))
+
+    async def get_users_many(
+        self, external_ids: Iterable[int], *, select: Optional[Sequence[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch several users concurrently; results keep the order of `external_ids`.
+        """
+        return list(await asyncio.gather(*(self.get_user(i, select=select) for i in external_ids)))
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Atomic token-bucket step. The current rate lives in the bucket hash so AIMD
+# adjustments made by one worker apply to every worker sharing the key.
+_TOKEN_BUCKET_LUA = """
+local burst = tonumber(ARGV[1])
+local default_rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'rate')
+local rate = tonumber(state[3]) or default_rate
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now, 'rate', rate)
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(wait)
+"""
+
+# Atomic AIMD step on the shared rate: rate * factor + step, clamped to [low, high].
+# Read and write in one script so concurrent workers never overwrite each other.
+_ADJUST_RATE_LUA = """
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or tonumber(ARGV[1])
+rate = rate * tonumber(ARGV[2]) + tonumber(ARGV[3])
+rate = math.max(tonumber(ARGV[4]), math.min(tonumber(ARGV[5]), rate))
+redis.call('HSET', KEYS[1], 'rate', rate)
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(rate)
+"""
+
+
+class LocalTokenBucket:
+    """
+    In-process token bucket (used when no REDIS_URL is configured).
+    """
+
+    def __init__(self, *, rate: float, burst: int) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token; return 0 on success or the seconds to wait before retrying."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._ts) * self._rate)
+            self._ts = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self._rate
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def adjust_rate(self, factor: float, step: float, *, low: float, high: float) -> float:
+        """Set the rate to `rate * factor + step` clamped to [low, high]; return it."""
+        with self._lock:
+            self._rate = max(low, min(high, self._rate * factor + step))
+            return self._rate
+
+
+class RedisTokenBucket:
+    """
+    Token bucket shared by every worker through one Redis hash.
+    """
+
+    def __init__(self, url: str, *, key: str, rate: float, burst: int) -> None:
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(_TOKEN_BUCKET_LUA)
+        self._adjust = self._redis.register_script(_ADJUST_RATE_LUA)
+        self._key = key
+        self._default_rate = rate
+        self._burst = burst
+
+    def try_acquire(self) -> float:
+        return float(self._script(keys=[self._key], args=[self._burst, self._default_rate]))
+
+    @property
+    def rate(self) -> float:
+        raw = self._redis.hget(self._key, "rate")
+        return float(raw) if raw is not None else self._default_rate
+
+    def adjust_rate(self, factor: float, step: float, *, low: float, high: float) -> float:
+        args = [self._default_rate, factor, step, low, high]
+        return float(self._adjust(keys=[self._key], args=args))
+
+
+class AdaptiveLimiter:
+    """
+    Token-bucket rate limit plus an AIMD concurrency limit for one provider.
+
+    Every response feeds back into the limits: 429/5xx (including statuses the
+    transport retried), connection errors or latency above `latency_target`
+    halve both the concurrency limit and the request rate; other responses grow
+    concurrency by 1/limit and the rate by 5% of `max_rate` per second.
+    """
+
+    _DECREASE_COOLDOWN = 1.0
+    _INCREASE_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        bucket: LocalTokenBucket | RedisTokenBucket,
+        *,
+        max_rate: float,
+        max_concurrency: int,
+        latency_target: float,
+    ) -> None:
+        self._bucket = bucket
+        self._max_rate = max_rate
+        self._min_rate = max(max_rate * 0.05, 0.1)
+        self._max_concurrency = max_concurrency
+        self._latency_target = latency_target
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._throttled = 0
+        self._last_decrease = 0.0
+        self._last_increase = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        """Block until a concurrency slot and a rate token are both available."""
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+        try:
+            while (wait := self._bucket.try_acquire()) > 0:
+                time.sleep(min(wait, 1.0))
+        except Exception:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify()
+            raise
+
+    def release(
+        self, status: Optional[int], latency: float, retried_statuses: Iterable[int] = ()
+    ) -> None:
+        """Free the slot and adapt limits from the observed response."""
+        overloaded = (
+            status is None
+            or status == 429
+            or status >= 500
+            or latency > self._latency_target
+            or any(s == 429 or s >= 500 for s in retried_statuses)
+        )
+        now = time.monotonic()
+        adjust: Optional[Tuple[float, float]] = None  # (factor, step) for the shared rate
+        with self._cond:
+            self._in_flight -= 1
+            if overloaded:
+                self._throttled += 1
+                if now - self._last_decrease >= self._DECREASE_COOLDOWN:
+                    self._last_decrease = now
+                    self._limit = max(1.0, self._limit / 2)
+                    adjust = (0.5, 0.0)
+            else:
+                self._limit = min(float(self._max_concurrency), self._limit + 1 / self._limit)
+                if now - self._last_increase >= self._INCREASE_INTERVAL:
+                    self._last_increase = now
+                    adjust = (1.0, self._max_rate * 0.05)
+            stats = self._stats()
+            self._cond.notify_all()
+        if adjust is None:
+            return
+        # One atomic step on the shared rate (a Redis round trip), outside the condition
+        rate = self._bucket.adjust_rate(*adjust, low=self._min_rate, high=self._max_rate)
+        if overloaded:
+            logger.warning("provider_limiter.decrease", extra={"rate": round(rate, 2), **stats})
+
+    def _stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": int(self._limit),
+            "in_flight": self._in_flight,
+            "throttled": self._throttled,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current rate (req/s), concurrency limit and throttle count, for monitoring."""
+        with self._cond:
+            stats = self._stats()
+        return {"rate": round(self._bucket.rate, 2), **stats}  # shared value, read unlocked
+
+
+@lru_cache(maxsize=None)
+def get_limiter(
+    name: str,
+    *,
+    rate: float,
+    burst: int,
+    max_concurrency: int,
+    latency_target: float,
+    redis_url: Optional[str] = None,
+) -> Optional[AdaptiveLimiter]:
+    """
+    Process-wide limiter for provider `name` (`rate <= 0` disables limiting).
+
+    With `redis_url` the token bucket is shared by all workers; otherwise it is per
+    process, so N worker processes may send up to N times `rate` (logged once per process).
+    """
+    if rate <= 0:
+        return None
+    if redis_url:
+        bucket: LocalTokenBucket | RedisTokenBucket = RedisTokenBucket(
+            redis_url, key=f"ratelimit:{name}", rate=rate, burst=burst
+        )
+    else:
+        logger.warning("provider_limiter.local_fallback", extra={"provider": name, "rate": rate})
+        bucket = LocalTokenBucket(rate=rate, burst=burst)
+    return AdaptiveLimiter(
+        bucket, max_rate=rate, max_concurrency=max_concurrency, latency_target=latency_target
+    )
@@ -1,17 +1,67 @@
 from __future__ import annotations
 
 from contextlib import contextmanager
-from typing import Iterator
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
 
-from sqlalchemy import create_engine
+from sqlalchemy import URL, create_engine, make_url, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
-from .settings import get_settings
+from .metrics import ROWS_UPSERTED, instrument_engine
+from .settings import Settings, get_settings
 
 settings = get_settings()
-engine = create_engine(settings.database_url, pool_pre_ping=True, future=True)
+
+
+def _pool_options(settings: Settings) -> Dict[str, Any]:
+    """QueuePool sizing from settings; SQLite keeps SQLAlchemy's default pool."""
+    if make_url(settings.database_url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_recycle": Settings.parse_duration(settings.db_pool_recycle),
+    }
+
+
+# Sync driver -> asyncio driver for the API read path
+_ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_database_url(settings: Settings) -> URL:
+    """ASYNC_DATABASE_URL, or DATABASE_URL with its driver swapped for an asyncio one."""
+    if settings.async_database_url:
+        return make_url(settings.async_database_url)
+    url = make_url(settings.database_url)
+    if url.get_driver_name() == "psycopg":  # psycopg 3 is async-capable as is
+        return url
+    driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No asyncio driver known for {url.get_backend_name()!r}")
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}")
+
+
+engine = create_engine(
+    settings.database_url, pool_pre_ping=True, future=True, **_pool_options(settings)
+)
+if settings.metrics_enabled:
+    instrument_engine(engine)
 SessionLocal = sessionmaker(bind=engine, expire_on_commit=False, class_=Session, future=True)
 
+# Used by the API only: requests wait on the database, not on a threadpool slot
+async_engine = create_async_engine(
+    async_database_url(settings), pool_pre_ping=True, **_pool_options(settings)
+)
+if settings.metrics_enabled:
+    instrument_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, expire_on_commit=False, class_=AsyncSession
+)
+
+# Lowest bind-parameter limit among supported backends (SQLite >= 3.32; Postgres allows 65535).
+_MAX_BIND_PARAMS = 32766
+
 
 @contextmanager
 def session_scope() -> Iterator[Session]:
@@ -25,3 +75,103 @@ def session_scope() -> Iterator[Session]:
         raise
     finally:
         session.close()
+
+
+def dialect_insert(session: Session):
+    """Return the dialect-specific `insert` supporting ON CONFLICT (Postgres, SQLite in tests)."""
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+def _upsert_statements(
+    session: Session,
+    model: Any,
+    rows: Sequence[Dict[str, Any]],
+    *,
+    conflict_cols: Sequence[str],
+    changed_cols: Sequence[str] | None,
+    chunk_size: int,
+) -> Iterator[Tuple[Any, int]]:
+    """Yield `(INSERT ... ON CONFLICT DO UPDATE, row count)` per chunk of deduplicated rows."""
+    deduped = list({tuple(r[c] for c in conflict_cols): r for r in rows}.values())
+    table = model.__table__
+    columns = len(table.columns)
+    chunk_size = max(1, min(chunk_size, _MAX_BIND_PARAMS // columns))
+    insert = dialect_insert(session)
+
+    for start in range(0, len(deduped), chunk_size):
+        chunk = deduped[start : start + chunk_size]
+        stmt = insert(model).values(chunk)
+        set_ = {k: stmt.excluded[k] for k in chunk[0] if k not in conflict_cols}
+        if "updated_at" in table.c:
+            set_.setdefault("updated_at", stmt.excluded.updated_at)
+        where = None
+        if changed_cols:
+            where = or_(*(table.c[k].is_distinct_from(stmt.excluded[k]) for k in changed_cols))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(conflict_cols), set_=set_, where=where
+        )
+        yield stmt, len(chunk)
+
+
+def bulk_upsert(
+    session: Session,
+    model: Any,
+    rows: Sequence[Dict[str, Any]],
+    *,
+    conflict_cols: Sequence[str],
+    changed_cols: Sequence[str] | None = None,
+    chunk_size: int = 500,
+) -> int:
+    """
+    Upsert rows with one multi-row INSERT ... ON CONFLICT DO UPDATE per chunk.
+
+    Rows sharing a conflict key are collapsed (last one wins), since a single
+    statement may not update the same row twice. With `changed_cols`, existing
+    rows are only updated (and `updated_at` bumped) when one of those columns
+    IS DISTINCT FROM the incoming value. Returns the number of rows inserted or
+    updated (the driver rowcount), so rows skipped by that guard are not counted.
+    """
+    sent = written = 0
+    for stmt, size in _upsert_statements(
+        session,
+        model,
+        rows,
+        conflict_cols=conflict_cols,
+        changed_cols=changed_cols,
+        chunk_size=chunk_size,
+    ):
+        written += session.execute(stmt).rowcount
+        sent += size
+    ROWS_UPSERTED.labels(table=model.__tablename__).inc(sent)
+    return written
+
+
+def bulk_upsert_returning(
+    session: Session,
+    model: Any,
+    rows: Sequence[Dict[str, Any]],
+    returning: Sequence[Any],
+    *,
+    conflict_cols: Sequence[str],
+    changed_cols: Sequence[str] | None = None,
+    chunk_size: int = 500,
+) -> List[Any]:
+    """
+    Same as `bulk_upsert`, but return the `returning` columns of every row written.
+
+    Rows skipped by the `changed_cols` guard are not written and so not returned.
+    """
+    written: List[Any] = []
+    for stmt, _ in _upsert_statements(
+        session,
+        model,
+        rows,
+        conflict_cols=conflict_cols,
+        changed_cols=changed_cols,
+        chunk_size=chunk_size,
+    ):
+        written.extend(session.execute(stmt.returning(*returning)).all())
+    ROWS_UPSERTED.labels(table=model.__tablename__).inc(len(written))
+    return written
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
 import logging
+import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 
 from app.api import routes_users
 
-from .db import engine
+from .db import async_engine, engine
 from .logging_config import setup_logging
+from .metrics import API_REQUEST_DURATION, render_latest
 from .models import Base
+from .settings import get_settings
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -26,6 +29,7 @@ async def lifespan(app: FastAPI):
     logger.info("db_tables_created")
     yield
     # shutdown (if you ever need to close sessions, cleanup, etc.)
+    await async_engine.dispose()
     logger.info("app_shutdown")
 
 
@@ -36,6 +40,29 @@ app = FastAPI(
 )
 
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observe latency per route template (e.g. `/users/{user_id}`), not per raw URL."""
+    if not get_settings().metrics_enabled:
+        return await call_next(request)
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    API_REQUEST_DURATION.labels(
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    ).observe(time.perf_counter() - started)
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    """Prometheus scrape endpoint."""
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+
 @app.get("/healthz")
 def healthz() -> dict[str, str]:
     """Simple health check endpoint."""
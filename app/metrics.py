@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import os
+import re
+import time
+from typing import Any, Dict, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+# Buckets in seconds, from fast SQL statements to long sync runs
+_FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+_TASK_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Celery task run time.",
+    ["task", "state"],
+    buckets=_TASK_BUCKETS,
+)
+PROVIDER_REQUEST_DURATION = Histogram(
+    "provider_request_duration_seconds",
+    "Latency of provider HTTP requests (after transport retries).",
+    ["provider", "endpoint", "status"],
+    buckets=_FAST_BUCKETS,
+)
+ROWS_UPSERTED = Counter(
+    "db_rows_upserted_total",
+    "Rows sent in bulk upserts; rate() gives rows per second.",
+    ["table"],
+)
+DB_STATEMENT_DURATION = Histogram(
+    "db_statement_duration_seconds",
+    "SQL statement execution time.",
+    ["operation"],
+    buckets=_FAST_BUCKETS,
+)
+API_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "API request latency per route template.",
+    ["method", "route", "status"],
+    buckets=_FAST_BUCKETS,
+)
+
+_ID_SEGMENT = re.compile(r"/\d+")
+
+
+def endpoint_label(path: str) -> str:
+    """Collapse numeric path segments (`users/42` -> `users/{id}`) to bound label cardinality."""
+    return _ID_SEGMENT.sub("/{id}", "/" + path.lstrip("/"))
+
+
+def observe_provider_request(provider: str, path: str, status: int | None, seconds: float) -> None:
+    PROVIDER_REQUEST_DURATION.labels(
+        provider=provider, endpoint=endpoint_label(path), status=str(status or "error")
+    ).observe(seconds)
+
+
+def _registry() -> CollectorRegistry:
+    """Registry to expose; aggregates every process when PROMETHEUS_MULTIPROC_DIR is set."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Body and content type for a `/metrics` response."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def instrument_engine(engine: Any) -> None:
+    """Time every statement on `engine` through cursor execute events."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_STATEMENT_DURATION.labels(operation=operation).observe(time.perf_counter() - started)
+
+
+def instrument_celery(*, exporter_port: int = 0) -> None:
+    """
+    Record task durations and, with `exporter_port`, serve them from the worker.
+
+    The exporter starts in the worker's main process; with prefork children set
+    PROMETHEUS_MULTIPROC_DIR so their samples are aggregated there.
+    """
+    from celery.signals import task_postrun, task_prerun, worker_init, worker_process_shutdown
+
+    started: Dict[str, float] = {}
+
+    @task_prerun.connect(weak=False)
+    def _task_started(task_id: str, **_: Any) -> None:
+        started[task_id] = time.perf_counter()
+
+    @task_postrun.connect(weak=False)
+    def _task_finished(task_id: str, task: Any, state: str | None = None, **_: Any) -> None:
+        begin = started.pop(task_id, None)
+        if begin is not None:
+            TASK_DURATION.labels(task=task.name, state=state or "UNKNOWN").observe(
+                time.perf_counter() - begin
+            )
+
+    if not exporter_port:
+        return
+
+    @worker_init.connect(weak=False)
+    def _start_exporter(**_: Any) -> None:
+        start_http_server(exporter_port, registry=_registry())
+
+    @worker_process_shutdown.connect(weak=False)
+    def _mark_dead(pid: int | None = None, **_: Any) -> None:
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            multiprocess.mark_process_dead(pid or os.getpid())
@@ -46,6 +46,13 @@ class User(Base, TimestampMixin):
     website: Mapped[Optional[str]] = mapped_column(String(255))
     company_name: Mapped[Optional[str]] = mapped_column(String(255))
 
+    # Fingerprint of the mapped provider payload; upserts skip rows whose hash is unchanged
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64))
+
+    # Enrichment leases: a worker that claimed the user owns it until this time
+    address_claimed_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    card_claimed_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
     # One-to-one relationships (uselist=False)
     address: Mapped[Optional[Address]] = relationship(
         back_populates="user", uselist=False, cascade="all, delete-orphan"
@@ -58,6 +65,44 @@ class User(Base, TimestampMixin):
         return f"User(id={self.id!r}, external_id={self.external_id!r}, email={self.email!r})"
 
 
+class SyncCheckpoint(Base, TimestampMixin):
+    """Progress of a paginated sync run: the provider offset up to which pages are committed."""
+
+    __tablename__ = "sync_checkpoints"
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    run_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    skip: Mapped[int] = mapped_column(nullable=False)
+
+
+class DataVersion(Base, TimestampMixin):
+    """Counter bumped by every committed write batch; API cache entries are keyed by it."""
+
+    __tablename__ = "data_versions"
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    version: Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+class EnrichmentFailure(Base, TimestampMixin):
+    """
+    Dead-letter record for a user whose provider payload could not be fetched.
+
+    `failures` counts enrichment runs that gave up on the user; at ENRICH_MAX_FAILURES
+    the user is no longer selected for that `kind` until the row is deleted.
+    """
+
+    __tablename__ = "enrichment_failures"
+    __table_args__ = (UniqueConstraint("user_id", "kind", name="uq_enrichment_failures_user_kind"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Target table name: "addresses" or "credit_cards"
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    failures: Mapped[int] = mapped_column(nullable=False, default=1)
+    last_error: Mapped[Optional[str]] = mapped_column(String(500))
+
+
 class Address(Base, TimestampMixin):
     __tablename__ = "addresses"
     __table_args__ = (UniqueConstraint("user_id", name="uq_addresses_user_id"),)
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import re
 from functools import lru_cache
+from typing import Literal, Optional
 
 from pydantic import Field, PositiveInt
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -16,17 +17,65 @@ class Settings(BaseSettings):
 
     # Database
     database_url: str = Field(alias="DATABASE_URL")
+    # asyncio URL for the API; derived from DATABASE_URL (asyncpg / aiosqlite) when unset
+    async_database_url: Optional[str] = Field(None, alias="ASYNC_DATABASE_URL")
+    # Connection pool per process (API worker or Celery child); ignored for SQLite
+    db_pool_size: PositiveInt = Field(5, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(10, ge=0, alias="DB_MAX_OVERFLOW")
+    db_pool_recycle: str = Field("30m", alias="DB_POOL_RECYCLE")
 
     # Celery broker/backends
     celery_broker_url: str = Field(alias="CELERY_BROKER_URL")
     celery_result_backend: str = Field(alias="CELERY_RESULT_BACKEND")
 
+    # Optional Redis for state shared across processes (caches, etc.)
+    redis_url: Optional[str] = Field(None, alias="REDIS_URL")
+
     # Schedules (human-friendly: e.g. 15m, 1h, 30s)
     users_every: str = Field("15m", alias="USERS_EVERY")
     enrich_addr_every: str = Field("10m", alias="ENRICH_ADDR_EVERY")
     enrich_card_every: str = Field("10m", alias="ENRICH_CARD_EVERY")
     batch_size: PositiveInt = Field(20, alias="BATCH_SIZE")
 
+    # Bulk writes: rows per multi-row INSERT ... ON CONFLICT statement
+    users_page_size: PositiveInt = Field(100, alias="USERS_PAGE_SIZE")
+    upsert_chunk_size: PositiveInt = Field(500, alias="UPSERT_CHUNK_SIZE")
+
+    # Pipelined sync: pages in flight and fetched pages buffered ahead of DB writes
+    sync_fetch_concurrency: PositiveInt = Field(4, alias="SYNC_FETCH_CONCURRENCY")
+    sync_queue_size: PositiveInt = Field(4, alias="SYNC_QUEUE_SIZE")
+    # Stream and incrementally parse pages instead of prefetching whole ones
+    sync_streaming: bool = Field(False, alias="SYNC_STREAMING")
+    # Write addresses/cards from the list_users payload; enrichment tasks handle stragglers
+    sync_ingest_related: bool = Field(True, alias="SYNC_INGEST_RELATED")
+    # Retries of the same run resume from the last committed page unless the checkpoint is older
+    sync_checkpoint_max_age: str = Field("1h", alias="SYNC_CHECKPOINT_MAX_AGE")
+
+    # Enrichment: provider requests in flight per batch
+    enrich_concurrency: PositiveInt = Field(8, alias="ENRICH_CONCURRENCY")
+    # How long a claimed user stays reserved for one worker (e.g. 5m)
+    enrich_claim_ttl: str = Field("5m", alias="ENRICH_CLAIM_TTL")
+    # Per-user retries of transient fetch errors (exponential backoff from ENRICH_ITEM_BACKOFF
+    # seconds) before the user is recorded as failed; 4xx other than 429 fail at once.
+    # After ENRICH_MAX_FAILURES failed runs the user is dead-lettered
+    enrich_item_retries: int = Field(2, ge=0, alias="ENRICH_ITEM_RETRIES")
+    enrich_item_backoff: float = Field(0.5, ge=0, alias="ENRICH_ITEM_BACKOFF")
+    enrich_max_failures: PositiveInt = Field(3, alias="ENRICH_MAX_FAILURES")
+    # Fan-out mode: beat runs a coordinator that splits the backlog into id-range shards
+    enrich_fanout: bool = Field(False, alias="ENRICH_FANOUT")
+    enrich_shard_size: PositiveInt = Field(500, alias="ENRICH_SHARD_SIZE")
+    # Queue enrichment for users inserted by sync_users right away (beat polling stays as a net)
+    enrich_on_insert: bool = Field(True, alias="ENRICH_ON_INSERT")
+
+    # Periodic tasks: skip runs that overlap a running one; lease renewed by heartbeat
+    task_single_flight: bool = Field(True, alias="TASK_SINGLE_FLIGHT")
+    task_lock_ttl: str = Field("2m", alias="TASK_LOCK_TTL")
+
+    # Prometheus: /metrics on the API; worker exporter port (0 disables). Set
+    # PROMETHEUS_MULTIPROC_DIR to aggregate prefork children / several API workers.
+    metrics_enabled: bool = Field(True, alias="METRICS_ENABLED")
+    worker_metrics_port: int = Field(0, ge=0, alias="WORKER_METRICS_PORT")
+
     # Data provider switch
     data_provider: str = Field("dummyjson", alias="DATA_PROVIDER")
 
@@ -41,6 +90,33 @@ class Settings(BaseSettings):
 
     request_timeout_seconds: PositiveInt = Field(10, alias="REQUEST_TIMEOUT_SECONDS")
 
+    # Provider HTTP transport: keep-alive pool shared per worker process
+    http_pool_size: PositiveInt = Field(10, alias="HTTP_POOL_SIZE")
+    http_max_retries: int = Field(3, ge=0, alias="HTTP_MAX_RETRIES")
+    http_backoff_factor: float = Field(0.3, ge=0, alias="HTTP_BACKOFF_FACTOR")
+
+    # Provider rate limit (req/s, shared through REDIS_URL when set; 0 disables) and AIMD bounds
+    provider_rate_limit: float = Field(20.0, ge=0, alias="PROVIDER_RATE_LIMIT")
+    provider_rate_burst: PositiveInt = Field(20, alias="PROVIDER_RATE_BURST")
+    provider_max_concurrency: PositiveInt = Field(16, alias="PROVIDER_MAX_CONCURRENCY")
+    provider_latency_target_ms: PositiveInt = Field(2000, alias="PROVIDER_LATENCY_TARGET_MS")
+
+    # Provider response cache (get_user / list_users); "redis" needs REDIS_URL
+    client_cache_backend: Literal["memory", "redis", "none"] = Field(
+        "memory", alias="CLIENT_CACHE_BACKEND"
+    )
+    client_cache_ttl: str = Field("15m", alias="CLIENT_CACHE_TTL")
+    client_cache_maxsize: PositiveInt = Field(10_000, alias="CLIENT_CACHE_MAXSIZE")
+
+    # API response cache (GET /users, /users/{id}), keyed by the data version tasks bump
+    api_cache_backend: Literal["memory", "redis", "none"] = Field(
+        "memory", alias="API_CACHE_BACKEND"
+    )
+    api_cache_ttl: str = Field("5m", alias="API_CACHE_TTL")
+    api_cache_maxsize: PositiveInt = Field(1_000, alias="API_CACHE_MAXSIZE")
+    # Rows fetched per round trip by GET /users/export (server-side cursor)
+    export_batch_size: PositiveInt = Field(1_000, alias="EXPORT_BATCH_SIZE")
+
     # Pydantic v2 settings config
     model_config = SettingsConfigDict(
         env_file=".env",
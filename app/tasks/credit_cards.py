@@ -1,31 +1,57 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, Iterable, List
+from functools import partial
+from typing import Any, Dict, List, Tuple
 
 from celery import shared_task
 from requests import RequestException
-from sqlalchemy.dialects.postgresql import insert
 
-from app.clients.dummyjson import DummyJSONClient
-from app.db import session_scope
-from app.models import CreditCard, User
-from app.settings import get_settings
+from app.clients.dummyjson import DummyJSONClient, get_client
+from app.models import CreditCard
+from app.settings import Settings, get_settings
+from app.tasks.enrichment import (
+    CARD_COLUMNS,
+    claim_users_missing,
+    dispatch_shards,
+    enrich_claimed,
+    enrich_users,
+    pending_user_ids,
+    plan_shards,
+)
+from app.utils.lock import single_flight
 
 logger = logging.getLogger(__name__)
 
 
-def _select_user_external_ids_without_card(batch_size: int | None) -> Iterable[int]:
-    with session_scope() as s:
-        q = (
-            s.query(User.external_id)
-            .outerjoin(CreditCard, CreditCard.user_id == User.id)
-            .filter(CreditCard.id.is_(None))
-            .order_by(User.id.asc())
-        )
-        if batch_size:
-            q = q.limit(batch_size)
-        return [row[0] for row in q.all()]
+def _select_users_without_card(
+    batch_size: int | None, id_range: Tuple[int, int] | None = None
+) -> List[Tuple[int, int]]:
+    return claim_users_missing(
+        CreditCard,
+        "card_claimed_until",
+        limit=batch_size,
+        lease_seconds=Settings.parse_duration(get_settings().enrich_claim_ttl),
+        max_failures=get_settings().enrich_max_failures,
+        id_range=id_range,
+    )
+
+
+def _enrich_cards(
+    client: DummyJSONClient, settings: Settings, users: List[Tuple[int, int]]
+) -> Dict[str, int]:
+    return enrich_users(
+        client,
+        users,
+        model=CreditCard,
+        mapper=client.map_credit_card,
+        select=client.ENRICH_FIELDS,
+        compare_cols=CARD_COLUMNS,
+        concurrency=settings.enrich_concurrency,
+        batch_size=settings.upsert_chunk_size,
+        item_retries=settings.enrich_item_retries,
+        item_backoff=settings.enrich_item_backoff,
+    )
 
 
 @shared_task(
@@ -34,34 +60,77 @@ def _select_user_external_ids_without_card(batch_size: int | None) -> Iterable[i
     retry_jitter=True,
     max_retries=5,
 )
+@single_flight("enrich_missing_cards")
 def enrich_missing_cards(batch_size: int | None = None) -> Dict[str, Any]:
     """
     Attach 1:1 credit cards to users missing one (DummyJSON). Idempotent.
+    sync_users already writes credit cards found in list_users; this handles stragglers.
     """
     settings = get_settings()
-    client = DummyJSONClient.from_settings(settings)
+    client = get_client()
 
     logger.info("enrich_missing_cards.started", extra={"batch_size": batch_size})
-    missing: List[int] = list(_select_user_external_ids_without_card(batch_size))
-    updated = 0
-
-    for ext_id in missing:
-        user_json = client.get_user(ext_id)
-        mapped = client.map_credit_card(user_json)
-        with session_scope() as s:
-            user = s.query(User).filter_by(external_id=ext_id).first()
-            if not user:
-                continue
-            stmt = (
-                insert(CreditCard)
-                .values(user_id=user.id, **mapped)
-                .on_conflict_do_update(
-                    index_elements=[CreditCard.user_id],
-                    set_={k: mapped[k] for k in mapped if k != "user_id"},
-                )
-            )
-            s.execute(stmt)
-        updated += 1
-
-    logger.info("enrich_missing_cards.finished", extra={"updated": updated})
-    return {"status": "ok", "updated": updated}
+    counts = enrich_claimed(
+        _select_users_without_card,
+        partial(_enrich_cards, client, settings),
+        limit=batch_size,
+        batch_size=settings.upsert_chunk_size,
+    )
+
+    logger.info(
+        "enrich_missing_cards.finished",
+        extra={
+            **counts,
+            "http": client.connection_stats(),
+            "cache": client.cache_stats(),
+            "limiter": client.limiter_stats(),
+        },
+    )
+    return {"status": "ok", **counts}
+
+
+@shared_task(
+    autoretry_for=(RequestException,),
+    retry_backoff=True,
+    retry_jitter=True,
+    max_retries=5,
+)
+def enrich_card_shard(first_id: int, last_id: int) -> Dict[str, Any]:
+    """
+    Attach credit cards to every user missing one with `first_id <= users.id <= last_id`.
+    """
+    settings = get_settings()
+    client = get_client()
+
+    counts = enrich_claimed(
+        partial(_select_users_without_card, id_range=(first_id, last_id)),
+        partial(_enrich_cards, client, settings),
+        limit=None,
+        batch_size=settings.upsert_chunk_size,
+    )
+
+    logger.info(
+        "enrich_card_shard.finished",
+        extra={"first_id": first_id, "last_id": last_id, **counts},
+    )
+    return {"status": "ok", **counts}
+
+
+@shared_task
+def enrich_missing_cards_sharded(shard_size: int | None = None) -> Dict[str, Any]:
+    """
+    Coordinator: split users missing a card into id-range shards and
+    enrich them as parallel `enrich_card_shard` subtasks.
+    """
+    settings = get_settings()
+    user_ids = pending_user_ids(
+        CreditCard, "card_claimed_until", max_failures=settings.enrich_max_failures
+    )
+    shards = plan_shards(user_ids, shard_size or settings.enrich_shard_size)
+    dispatch_id = dispatch_shards("enrich_missing_cards", enrich_card_shard, shards)
+
+    logger.info(
+        "enrich_missing_cards.fanout_started",
+        extra={"users": len(user_ids), "shards": len(shards), "dispatch_id": dispatch_id},
+    )
+    return {"status": "dispatched", "users": len(user_ids), "shards": len(shards)}
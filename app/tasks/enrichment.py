@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from celery import chord, current_app, group, shared_task
+from celery.canvas import Signature
+from requests import ConnectionError, HTTPError, RequestException, Timeout
+from sqlalchemy import delete, exists, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.clients.dummyjson import RETRY_STATUSES, DummyJSONClient
+from app.db import bulk_upsert, dialect_insert, session_scope
+from app.models import EnrichmentFailure, User
+from app.utils.data_version import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+# Scalar columns compared before rewriting related rows (JSON has no equality operator in Postgres)
+ADDRESS_COLUMNS = ["street", "street_name", "city", "state", "country", "zip", "lat", "lng"]
+CARD_COLUMNS = ["cc_number", "cc_type", "exp_month", "exp_year"]
+_CLAIM_CHUNK = 10_000
+
+
+def _missing_users_query(model: Any, claim_col: str, now: datetime, max_failures: int) -> Any:
+    """
+    Users with no `model` row (NOT EXISTS on its unique user_id index), no live lease
+    and fewer than `max_failures` recorded failures for this table.
+    """
+    claimed_until = User.__table__.c[claim_col]
+    dead_lettered = exists().where(
+        EnrichmentFailure.user_id == User.id,
+        EnrichmentFailure.kind == model.__tablename__,
+        EnrichmentFailure.failures >= max_failures,
+    )
+    return (
+        select(User.id, User.external_id)
+        .where(~exists().where(model.user_id == User.id))
+        .where(~dead_lettered)
+        .where(or_(claimed_until.is_(None), claimed_until < now))
+        .order_by(User.id.asc())
+    )
+
+
+def claim_users_missing(
+    model: Any,
+    claim_col: str,
+    *,
+    limit: int | None,
+    lease_seconds: int,
+    max_failures: int,
+    id_range: Tuple[int, int] | None = None,
+) -> List[Tuple[int, int]]:
+    """
+    Atomically claim up to `limit` users missing a `model` row; returns `(user_id, external_id)`.
+
+    Candidate rows are locked with FOR UPDATE SKIP LOCKED (a no-op on SQLite), so
+    concurrent workers never wait on each other, and leased by setting `claim_col`
+    to now + `lease_seconds` in the same short transaction. Other workers skip
+    leased users until the lease expires, which also recovers users claimed by a
+    worker that crashed before writing them.
+    """
+    now = datetime.utcnow()
+    q = _missing_users_query(model, claim_col, now, max_failures).with_for_update(
+        skip_locked=True, of=User
+    )
+    if id_range:
+        q = q.where(User.id.between(*id_range))
+    if limit:
+        q = q.limit(limit)
+    with session_scope() as s:
+        claimed = [(row[0], row[1]) for row in s.execute(q).all()]
+        lease = {
+            claim_col: now + timedelta(seconds=lease_seconds),
+            "updated_at": User.updated_at,  # a lease is not a content change
+        }
+        # Chunked so an unbounded claim stays under the backend's bind-parameter limit
+        for start in range(0, len(claimed), _CLAIM_CHUNK):
+            ids = [user_id for user_id, _ in claimed[start : start + _CLAIM_CHUNK]]
+            s.execute(update(User).where(User.id.in_(ids)).values(lease))
+    return claimed
+
+
+def pending_user_ids(model: Any, claim_col: str, *, max_failures: int) -> List[int]:
+    """Ids of users missing a `model` row that nobody holds a lease on (no locking)."""
+    with session_scope() as s:
+        q = _missing_users_query(model, claim_col, datetime.utcnow(), max_failures)
+        return [row[0] for row in s.execute(q).all()]
+
+
+def _is_transient(exc: RequestException) -> bool:
+    """Connection errors, timeouts and 429/5xx are worth retrying; other 4xx are permanent."""
+    if isinstance(exc, (ConnectionError, Timeout)):
+        return True
+    response = exc.response if isinstance(exc, HTTPError) else None
+    return response is not None and response.status_code in RETRY_STATUSES
+
+
+def _fetch_with_retry(
+    fetch: Callable[[int], Dict[str, Any]], external_id: int, *, retries: int, backoff: float
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Fetch one user, retrying transient errors with jittered exponential backoff.
+
+    429/5xx reach this point only once the transport's own retries are spent.
+    Permanent errors (e.g. 404 for a deleted user) fail at once. Returns (payload, error).
+    """
+    attempt = 0
+    while True:
+        try:
+            return fetch(external_id), None
+        except RequestException as exc:
+            if attempt >= retries or not _is_transient(exc):
+                return None, f"{type(exc).__name__}: {exc}"[:500]
+        time.sleep(backoff * 2**attempt * random.uniform(0.5, 1.5))
+        attempt += 1
+
+
+def _record_failures(s: Session, kind: str, failed: List[Tuple[int, str]]) -> None:
+    """Insert or bump dead-letter rows for `(user_id, error)` pairs."""
+    now = datetime.utcnow()
+    stmt = dialect_insert(s)(EnrichmentFailure).values(
+        [
+            {
+                "user_id": user_id,
+                "kind": kind,
+                "failures": 1,
+                "last_error": error,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for user_id, error in failed
+        ]
+    )
+    s.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["user_id", "kind"],
+            set_={
+                "failures": EnrichmentFailure.failures + 1,
+                "last_error": stmt.excluded.last_error,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+    )
+
+
+def enrich_users(
+    client: DummyJSONClient,
+    users: Sequence[Tuple[int, int]],
+    *,
+    model: Any,
+    mapper: Callable[[Dict[str, Any]], Dict[str, Any]],
+    select: Sequence[str],
+    compare_cols: Sequence[str],
+    concurrency: int,
+    batch_size: int,
+    item_retries: int = 2,
+    item_backoff: float = 0.5,
+) -> Dict[str, int]:
+    """
+    Fetch provider payloads for `(user_id, external_id)` pairs and upsert mapped rows.
+
+    Only the `select` fields the mapper reads are requested. Each batch is fetched
+    with up to `concurrency` requests in flight and written with one bulk upsert
+    keyed by `user_id`. Failures are isolated per user: a fetch is retried
+    `item_retries` times with backoff, then recorded in `enrichment_failures`
+    while the rest of the batch is still written. Batches that wrote rows bump the
+    data version in their transaction. Returns `updated` / `failed` counts.
+    """
+    fetch = partial(
+        _fetch_with_retry,
+        partial(client.get_user, select=select),
+        retries=item_retries,
+        backoff=item_backoff,
+    )
+    kind = model.__tablename__
+    written = failed_total = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="enrich-fetch") as pool:
+        for start in range(0, len(users), batch_size):
+            batch = users[start : start + batch_size]
+            results = pool.map(fetch, [ext_id for _, ext_id in batch])
+            rows: List[Dict[str, Any]] = []
+            failed: List[Tuple[int, str]] = []
+            for (user_id, _), (payload, error) in zip(batch, results, strict=True):
+                if payload is None:
+                    failed.append((user_id, error or "unknown error"))
+                else:
+                    rows.append({"user_id": user_id, **mapper(payload)})
+            with session_scope() as s:
+                batch_written = bulk_upsert(
+                    s,
+                    model,
+                    rows,
+                    conflict_cols=["user_id"],
+                    changed_cols=compare_cols,
+                    chunk_size=batch_size,
+                )
+                if rows:
+                    s.execute(
+                        delete(EnrichmentFailure).where(
+                            EnrichmentFailure.kind == kind,
+                            EnrichmentFailure.user_id.in_([row["user_id"] for row in rows]),
+                        )
+                    )
+                if failed:
+                    _record_failures(s, kind, failed)
+                if batch_written:
+                    bump_data_version(s)
+            written += batch_written
+            failed_total += len(failed)
+            logger.info(
+                "enrichment.batch_written",
+                extra={"table": kind, "rows": len(rows), "failed": len(failed)},
+            )
+            if failed:
+                logger.warning(
+                    "enrichment.items_failed",
+                    extra={"table": kind, "user_ids": [user_id for user_id, _ in failed]},
+                )
+    return {"updated": written, "failed": failed_total}
+
+
+def enrich_claimed(
+    claim: Callable[[int], List[Tuple[int, int]]],
+    enrich: Callable[[List[Tuple[int, int]]], Dict[str, int]],
+    *,
+    limit: int | None,
+    batch_size: int,
+) -> Dict[str, int]:
+    """
+    Claim and enrich users one batch of `batch_size` at a time, up to `limit` users (all when None).
+
+    Each batch is leased right before it is fetched, so a lease only has to outlive
+    one batch instead of the whole run. Stops at the first short claim. Returns the
+    summed `updated` / `failed` counts.
+    """
+    counts = {"updated": 0, "failed": 0}
+    remaining = limit or None
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        users = claim(size)
+        if users:
+            for key, value in enrich(users).items():
+                counts[key] += value
+        if remaining is not None:
+            remaining -= len(users)
+        if len(users) < size:
+            break
+    return counts
+
+
+def plan_shards(user_ids: Sequence[int], shard_size: int) -> List[Tuple[int, int]]:
+    """
+    Split ascending user ids into inclusive `(first_id, last_id)` ranges of `shard_size` users.
+    """
+    return [
+        (user_ids[start], user_ids[min(start + shard_size, len(user_ids)) - 1])
+        for start in range(0, len(user_ids), shard_size)
+    ]
+
+
+@shared_task
+def sum_shard_results(results: List[Dict[str, Any]], *, name: str) -> Dict[str, Any]:
+    """
+    Chord callback: aggregate per-shard enrichment counts.
+    """
+    updated = sum(int(r.get("updated", 0)) for r in results)
+    failed = sum(int(r.get("failed", 0)) for r in results)
+    logger.info(
+        "enrichment.fanout_finished",
+        extra={"task": name, "shards": len(results), "updated": updated, "failed": failed},
+    )
+    return {"status": "ok", "shards": len(results), "updated": updated, "failed": failed}
+
+
+def dispatch_shards(name: str, shard_task: Any, shards: Sequence[Tuple[int, int]]) -> str | None:
+    """
+    Run one `shard_task(first_id, last_id)` per shard in parallel.
+
+    With a chord-capable result backend the shard counts are aggregated by
+    `sum_shard_results`; the default `rpc://` backend has no chord support, so
+    there the shards run as a plain group. Returns the group/chord id.
+    """
+    if not shards:
+        return None
+    header = group(shard_task.s(first_id, last_id) for first_id, last_id in shards)
+    try:
+        current_app.backend.ensure_chords_allowed()
+    except NotImplementedError:
+        logger.warning(
+            "enrichment.fanout_without_chord", extra={"task": name, "shards": len(shards)}
+        )
+        return header.apply_async().id
+    callback: Signature = sum_shard_results.s(name=name)
+    return chord(header)(callback).id
@@ -1,62 +1,379 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
 
 from celery import shared_task
 from requests import RequestException
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import delete, or_, select
+from sqlalchemy.orm import Session
 
-from app.clients.dummyjson import DummyJSONClient
-from app.db import session_scope
-from app.models import User
-from app.settings import get_settings
+from app.clients.dummyjson import DummyJSONClient, PageStats, get_client
+from app.db import bulk_upsert, bulk_upsert_returning, session_scope
+from app.models import Address, CreditCard, SyncCheckpoint, User
+from app.settings import Settings, get_settings
+from app.tasks.addresses import enrich_address_shard
+from app.tasks.credit_cards import enrich_card_shard
+from app.tasks.enrichment import ADDRESS_COLUMNS, CARD_COLUMNS, plan_shards
+from app.utils.data_version import bump_data_version
+from app.utils.fingerprint import content_fingerprint
+from app.utils.lock import single_flight
 
 logger = logging.getLogger(__name__)
 
+_DONE = object()
+_CHECKPOINT = "sync_users"
+
+
+def _iter_pages(
+    client: DummyJSONClient,
+    *,
+    limit: int,
+    select: Sequence[str],
+    concurrency: int,
+    queue_size: int,
+    start: int = 0,
+) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Yield `(next_skip, page)` for DummyJSON user pages from offset `start`, in order,
+    prefetching them in the background.
+
+    The first page is fetched inline to learn `total`. The remaining pages are
+    fetched by a producer thread with at most `concurrency` requests in flight and
+    handed over through a queue of `queue_size` pages, so HTTP overlaps with the
+    caller's database writes. Fetch errors are re-raised in the caller.
+    """
+    first, total = client.list_users(limit=limit, skip=start, select=select, use_cache=False)
+    if not first:
+        return
+    yield start + limit, first
+
+    skips = range(start + limit, total, limit)
+    if not skips:
+        return
+
+    pages: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item: Any) -> None:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def produce() -> None:
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sync-users-fetch")
+        in_flight: deque = deque()
+
+        def hand_over_oldest() -> None:
+            skip, future = in_flight.popleft()
+            put((skip + limit, future.result()[0]))
+
+        try:
+            for skip in skips:
+                if stop.is_set():
+                    break
+                future = pool.submit(
+                    client.list_users, limit=limit, skip=skip, select=select, use_cache=False
+                )
+                in_flight.append((skip, future))
+                if len(in_flight) >= concurrency:
+                    hand_over_oldest()
+            while in_flight and not stop.is_set():
+                hand_over_oldest()
+            put(_DONE)
+        except BaseException as exc:  # handed to the consumer thread
+            put(exc)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    producer = threading.Thread(target=produce, name="sync-users-producer", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            if item[1]:
+                yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+def _iter_streamed_batches(
+    client: DummyJSONClient,
+    *,
+    limit: int,
+    select: Sequence[str],
+    batch_size: int,
+    start: int = 0,
+) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Yield `(next_skip, batch)` of raw users streamed by DummyJSONClient.iter_users
+    from offset `start`, in batches of `batch_size`.
+
+    Only the current batch is held in memory, however large the page size is.
+    """
+
+    def log_page(stats: PageStats) -> None:
+        logger.debug("sync_users.page", extra=asdict(stats))
+
+    users = client.iter_users(
+        page_size=limit, skip=start, select=select, mapper=lambda u: u, on_page=log_page
+    )
+    consumed = start
+    while batch := list(islice(users, batch_size)):
+        consumed += len(batch)
+        yield consumed, batch
+
+
+def _upsert_users(
+    s: Session, mapped: List[Dict[str, Any]], chunk_size: int
+) -> Tuple[Dict[str, int], Dict[int, int]]:
+    """
+    Write one page of mapped users, skipping rows whose fingerprint is unchanged.
+
+    Stored fingerprints are read first to split the page into inserted, updated
+    and unchanged rows; only the first two are sent to the database. The upsert
+    keeps an IS DISTINCT FROM guard for rows changed by a concurrent run.
+    Returns the counts and `{external_id: id}` of the newly inserted users,
+    read back through RETURNING.
+    """
+    by_ext_id = {
+        row["external_id"]: {**row, "content_hash": content_fingerprint(row)} for row in mapped
+    }
+    stored = dict(
+        s.execute(
+            select(User.external_id, User.content_hash).where(User.external_id.in_(by_ext_id))
+        ).all()
+    )
+    inserted = [row for ext_id, row in by_ext_id.items() if ext_id not in stored]
+    updated = [
+        row
+        for ext_id, row in by_ext_id.items()
+        if ext_id in stored and stored[ext_id] != row["content_hash"]
+    ]
+    written = bulk_upsert_returning(
+        s,
+        User,
+        inserted + updated,
+        [User.id, User.external_id],
+        conflict_cols=["external_id"],
+        changed_cols=["content_hash"],
+        chunk_size=chunk_size,
+    )
+    inserted_ext_ids = {row["external_id"] for row in inserted}
+    new_users = {ext_id: user_id for user_id, ext_id in written if ext_id in inserted_ext_ids}
+    counts = {
+        "inserted": len(inserted),
+        "updated": len(updated),
+        "unchanged": len(by_ext_id) - len(inserted) - len(updated),
+    }
+    return counts, new_users
+
+
+def _upsert_related(s: Session, payload: List[Dict[str, Any]], chunk_size: int) -> Dict[str, int]:
+    """
+    Write addresses and credit cards carried by a list_users page.
+
+    Runs in the page transaction, right after the users upsert. Users whose
+    payload has no `address` / `bank` are left to the enrichment tasks. Returns
+    the rows actually written; unchanged ones are skipped by the upsert guard.
+    """
+    user_ids = dict(
+        s.execute(
+            select(User.external_id, User.id).where(
+                User.external_id.in_([int(u["id"]) for u in payload])
+            )
+        ).all()
+    )
+    addresses = [
+        {"user_id": user_ids[int(u["id"])], **DummyJSONClient.map_address(u)}
+        for u in payload
+        if u.get("address")
+    ]
+    cards = [
+        {"user_id": user_ids[int(u["id"])], **DummyJSONClient.map_credit_card(u)}
+        for u in payload
+        if u.get("bank")
+    ]
+    written_addresses = bulk_upsert(
+        s,
+        Address,
+        addresses,
+        conflict_cols=["user_id"],
+        changed_cols=ADDRESS_COLUMNS,
+        chunk_size=chunk_size,
+    )
+    written_cards = bulk_upsert(
+        s,
+        CreditCard,
+        cards,
+        conflict_cols=["user_id"],
+        changed_cols=CARD_COLUMNS,
+        chunk_size=chunk_size,
+    )
+    return {"addresses": written_addresses, "cards": written_cards}
+
+
+def _resume_skip(run_id: str, max_age: int) -> int:
+    """
+    Offset to resume `run_id` from: its own checkpoint if younger than `max_age` seconds.
+
+    A checkpoint left by another run, or a stale one, is discarded.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    with session_scope() as s:
+        s.execute(
+            delete(SyncCheckpoint).where(
+                SyncCheckpoint.name == _CHECKPOINT,
+                or_(SyncCheckpoint.run_id != run_id, SyncCheckpoint.updated_at < cutoff),
+            )
+        )
+        skip = s.scalar(select(SyncCheckpoint.skip).where(SyncCheckpoint.name == _CHECKPOINT))
+    return skip or 0
+
+
+def _save_checkpoint(s: Session, run_id: str, skip: int) -> None:
+    """Record `skip` as committed for `run_id`; call inside the page transaction."""
+    bulk_upsert(
+        s,
+        SyncCheckpoint,
+        [{"name": _CHECKPOINT, "run_id": run_id, "skip": skip, "updated_at": datetime.utcnow()}],
+        conflict_cols=["name"],
+    )
+
+
+def _enqueue_enrichment(address_ids: List[int], card_ids: List[int], shard_size: int) -> int:
+    """
+    Queue id-range enrichment shards covering newly inserted users; returns the shard count.
+    """
+    queued = 0
+    for task, user_ids in ((enrich_address_shard, address_ids), (enrich_card_shard, card_ids)):
+        for first_id, last_id in plan_shards(sorted(user_ids), shard_size):
+            task.delay(first_id, last_id)
+            queued += 1
+    return queued
+
 
 @shared_task(
     autoretry_for=(RequestException,),
     retry_backoff=True,
     retry_jitter=True,
     max_retries=5,
+    bind=True,
 )
-def sync_users() -> Dict[str, Any]:
+@single_flight("sync_users")
+def sync_users(self) -> Dict[str, Any]:
     """
     Periodically sync users from DummyJSON and upsert into DB.
     Idempotent by users.external_id UNIQUE.
+
+    Pages are fetched concurrently ahead of the writer and each page is written
+    with one multi-row upsert (chunked by UPSERT_CHUNK_SIZE). Rows whose content
+    fingerprint did not change are not rewritten. With SYNC_INGEST_RELATED,
+    addresses and cards from the same payload are written in the page transaction.
+    With SYNC_STREAMING, pages are instead streamed and parsed incrementally and
+    written in UPSERT_CHUNK_SIZE batches, keeping memory flat for large pages.
+    With ENRICH_ON_INSERT, newly inserted users still missing an address or card
+    are handed to the enrichment shard tasks as soon as their page is committed.
+
+    Every page commits a checkpoint (next offset + task id) with its rows, so a
+    retry of the same task resumes after the last committed page instead of
+    starting over; checkpoints older than SYNC_CHECKPOINT_MAX_AGE are ignored.
+    Pages that wrote rows also bump the data version the API response cache is keyed by.
     """
     settings = get_settings()
-    client = DummyJSONClient.from_settings(settings)
+    client = get_client()
+    run_id = self.request.id or uuid.uuid4().hex
+    start = _resume_skip(run_id, Settings.parse_duration(settings.sync_checkpoint_max_age))
 
-    logger.info("sync_users.started", extra={"task": "sync_users"})
+    logger.info(
+        "sync_users.started",
+        extra={"task": "sync_users", "run_id": run_id, "resumed_from": start},
+    )
 
-    limit = 100
-    skip = 0
-    total_synced = 0
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    related = {"addresses": 0, "cards": 0}
+    enrich_queued = 0
+    db_seconds = 0.0
 
-    while True:
-        payload, total = client.list_users(limit=limit, skip=skip)
-        if not payload:
-            break
+    select = client.USER_FIELDS
+    if settings.sync_ingest_related:
+        select += client.ADDRESS_FIELDS + client.CARD_FIELDS
 
+    if settings.sync_streaming:
+        pages = _iter_streamed_batches(
+            client,
+            limit=settings.users_page_size,
+            select=select,
+            batch_size=settings.upsert_chunk_size,
+            start=start,
+        )
+    else:
+        pages = _iter_pages(
+            client,
+            limit=settings.users_page_size,
+            select=select,
+            concurrency=settings.sync_fetch_concurrency,
+            queue_size=settings.sync_queue_size,
+            start=start,
+        )
+    for next_skip, payload in pages:
+        rows = [client.map_user(u) for u in payload]
+        started = time.perf_counter()
         with session_scope() as s:
-            for u in payload:
-                mapped = client.map_user(u)
-                stmt = (
-                    insert(User)
-                    .values(**mapped)
-                    .on_conflict_do_update(
-                        index_elements=[User.external_id],
-                        set_={k: mapped[k] for k in mapped if k != "external_id"},
-                    )
-                )
-                s.execute(stmt)
-                total_synced += 1
+            page_counts, new_users = _upsert_users(s, rows, settings.upsert_chunk_size)
+            if settings.sync_ingest_related:
+                page_counts.update(_upsert_related(s, payload, settings.upsert_chunk_size))
+            _save_checkpoint(s, run_id, next_skip)
+            # Only when rows were written: the related upserts skip unchanged rows
+            if any(page_counts.get(k) for k in ("inserted", "updated", "addresses", "cards")):
+                bump_data_version(s)
+        db_seconds += time.perf_counter() - started
+        for key, value in page_counts.items():
+            (counts if key in counts else related)[key] += value
+
+        if settings.enrich_on_insert and new_users:
+            ingested = settings.sync_ingest_related
+            new_payload = [
+                (new_users[int(u["id"])], u) for u in payload if int(u["id"]) in new_users
+            ]
+            enrich_queued += _enqueue_enrichment(
+                [uid for uid, u in new_payload if not (ingested and u.get("address"))],
+                [uid for uid, u in new_payload if not (ingested and u.get("bank"))],
+                settings.enrich_shard_size,
+            )
 
-        skip += limit
-        if skip >= total:
-            break
+    with session_scope() as s:
+        s.execute(delete(SyncCheckpoint).where(SyncCheckpoint.name == _CHECKPOINT))
 
-    logger.info("sync_users.finished", extra={"synced": total_synced})
-    return {"status": "ok", "synced": total_synced}
+    total_synced = sum(counts.values())
+    rows_per_sec = round(total_synced / db_seconds, 1) if db_seconds else 0.0
+    result = {
+        "synced": total_synced,
+        **counts,
+        **related,
+        "resumed_from": start,
+        "enrich_queued": enrich_queued,
+        "rows_per_sec": rows_per_sec,
+    }
+    logger.info(
+        "sync_users.finished",
+        extra={**result, "http": client.connection_stats(), "limiter": client.limiter_stats()},
+    )
+    return {"status": "ok", **result}
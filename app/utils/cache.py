@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with a per-entry TTL and LRU eviction.
+    """
+
+    backend = "memory"
+
+    def __init__(self, *, maxsize: int, ttl: float) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self._ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "hits": self.hits, "misses": self.misses}
+
+
+class RedisCache:
+    """
+    JSON values in Redis with a TTL (SETEX), shared by every process.
+
+    LRU eviction is delegated to Redis (`maxmemory-policy allkeys-lru`).
+    Hit/miss counters are per process.
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str, *, ttl: float, namespace: str) -> None:
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._ttl = max(int(ttl), 1)
+        self._prefix = f"{namespace}:"
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._redis.get(self._prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any) -> None:
+        self._redis.setex(self._prefix + key, self._ttl, json.dumps(value))
+
+    def clear(self) -> None:
+        for key in self._redis.scan_iter(match=self._prefix + "*"):
+            self._redis.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "hits": self.hits, "misses": self.misses}
+
+
+@lru_cache(maxsize=None)
+def get_cache(
+    namespace: str, *, backend: str, ttl: float, maxsize: int, redis_url: Optional[str] = None
+) -> Optional[TTLCache | RedisCache]:
+    """
+    Process-wide cache for `namespace` ("none" disables caching).
+
+    Falls back to the in-process cache when the Redis backend has no URL configured.
+    """
+    if backend == "none":
+        return None
+    if backend == "redis" and redis_url:
+        return RedisCache(redis_url, ttl=ttl, namespace=namespace)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db import dialect_insert
+from app.models import DataVersion
+
+# The users API serves users, addresses and credit cards; one version covers all three
+USERS = "users"
+
+
+def bump_data_version(s: Session, name: str = USERS) -> None:
+    """
+    Increment the `name` version; call last in a writing transaction.
+
+    The counter row stays locked until commit, so bumping right before it keeps
+    concurrent writers from queueing on the row while they still do real work.
+    """
+    insert = dialect_insert(s)
+    stmt = insert(DataVersion).values(name=name, version=1, updated_at=datetime.utcnow())
+    s.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"version": DataVersion.version + 1, "updated_at": stmt.excluded.updated_at},
+        )
+    )
+
+
+async def current_data_version(db: AsyncSession, name: str = USERS) -> int:
+    """Latest committed `name` version (0 before the first write)."""
+    version = await db.scalar(select(DataVersion.version).where(DataVersion.name == name))
+    return version or 0
@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Mapping
+
+
+def content_fingerprint(row: Mapping[str, Any]) -> str:
+    """
+    Stable SHA-256 hex digest of a mapped row.
+
+    Keys are sorted so the digest only changes when a value changes.
+    """
+    canonical = json.dumps(row, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, Optional
+
+from app.settings import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+# Only the owner (matching token) may extend or delete the lease.
+_EXTEND_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  redis.call('DEL', KEYS[1])
+  local skipped = redis.call('GET', KEYS[2]) or 0
+  redis.call('DEL', KEYS[2])
+  return tonumber(skipped)
+end
+return 0
+"""
+
+
+class LocalLease:
+    """
+    In-process lease (used when no REDIS_URL is configured); guards one worker process only.
+    """
+
+    def __init__(self, name: str, *, ttl: float) -> None:
+        self.name = name
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._token: Optional[str] = None
+        self._expires = 0.0
+        self._skipped = 0
+
+    def acquire(self) -> Optional[str]:
+        with self._lock:
+            now = time.monotonic()
+            if self._token is not None and self._expires > now:
+                return None
+            self._token = uuid.uuid4().hex
+            self._expires = now + self._ttl
+            self._skipped = 0
+            return self._token
+
+    def extend(self, token: str) -> bool:
+        with self._lock:
+            if self._token != token:
+                return False
+            self._expires = time.monotonic() + self._ttl
+            return True
+
+    def release(self, token: str) -> int:
+        with self._lock:
+            if self._token != token:
+                return 0
+            skipped, self._skipped, self._token = self._skipped, 0, None
+            return skipped
+
+    def record_skip(self) -> int:
+        with self._lock:
+            self._skipped += 1
+            return self._skipped
+
+
+class RedisLease:
+    """
+    Lease shared by every worker: `SET NX PX` on `lock:<name>` holding a random token.
+
+    Runs that find the lease taken increment `lock:<name>:skipped`; the owner reads
+    and resets that counter when it releases.
+    """
+
+    def __init__(self, url: str, name: str, *, ttl: float) -> None:
+        import redis
+
+        self.name = name
+        self._redis = redis.Redis.from_url(url)
+        self._key = f"lock:{name}"
+        self._skipped_key = f"{self._key}:skipped"
+        self._ttl_ms = max(int(ttl * 1000), 1)
+        self._extend = self._redis.register_script(_EXTEND_LUA)
+        self._release = self._redis.register_script(_RELEASE_LUA)
+
+    def acquire(self) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if self._redis.set(self._key, token, nx=True, px=self._ttl_ms):
+            return token
+        return None
+
+    def extend(self, token: str) -> bool:
+        return bool(self._extend(keys=[self._key], args=[token, self._ttl_ms]))
+
+    def release(self, token: str) -> int:
+        return int(self._release(keys=[self._key, self._skipped_key], args=[token]))
+
+    def record_skip(self) -> int:
+        pipe = self._redis.pipeline()
+        pipe.incr(self._skipped_key)
+        pipe.pexpire(self._skipped_key, self._ttl_ms * 10)
+        return int(pipe.execute()[0])
+
+
+class _Heartbeat(threading.Thread):
+    """Extends a held lease every `interval` seconds until stopped."""
+
+    def __init__(self, lease: LocalLease | RedisLease, token: str, interval: float) -> None:
+        super().__init__(name=f"lease-heartbeat-{lease.name}", daemon=True)
+        self._lease = lease
+        self._token = token
+        self._interval = interval
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(self._interval):
+            try:
+                if not self._lease.extend(self._token):
+                    logger.warning("lease.lost", extra={"lock": self._lease.name})
+                    return
+            except Exception:  # a transient Redis error must not kill the task
+                logger.warning("lease.heartbeat_failed", extra={"lock": self._lease.name})
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join()
+
+
+@lru_cache(maxsize=None)
+def get_lease(name: str, *, ttl: float, redis_url: Optional[str] = None) -> LocalLease | RedisLease:
+    """
+    Process-wide lease for `name`, in Redis when `redis_url` is set.
+
+    The in-process fallback only guards one worker process: under the prefork pool
+    every child has its own, so overlapping runs are not prevented. That is logged
+    once per lease and process.
+    """
+    if redis_url:
+        return RedisLease(redis_url, name, ttl=ttl)
+    logger.warning("lease.local_fallback", extra={"lock": name})
+    return LocalLease(name, ttl=ttl)
+
+
+def single_flight(name: str) -> Callable[[Callable[..., Dict[str, Any]]], Callable[..., Any]]:
+    """
+    Let only one run of a periodic task execute at a time.
+
+    The wrapped task holds a lease (TASK_LOCK_TTL) renewed by a heartbeat every
+    third of the TTL, so a crashed worker frees it within one TTL. Overlapping
+    runs return `{"status": "skipped", ...}` immediately; the run holding the
+    lease reports how many runs it absorbed as `coalesced`.
+    """
+
+    def decorator(fn: Callable[..., Dict[str, Any]]) -> Callable[..., Any]:
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+            settings = get_settings()
+            if not settings.task_single_flight:
+                return fn(*args, **kwargs)
+
+            ttl = Settings.parse_duration(settings.task_lock_ttl)
+            lease = get_lease(name, ttl=ttl, redis_url=settings.redis_url)
+            token = lease.acquire()
+            if token is None:
+                skipped = lease.record_skip()
+                logger.info(
+                    "task.skipped",
+                    extra={"task": name, "reason": "already_running", "skipped": skipped},
+                )
+                return {"status": "skipped", "reason": "already_running", "skipped": skipped}
+
+            heartbeat = _Heartbeat(lease, token, interval=max(ttl / 3, 0.1))
+            heartbeat.start()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                heartbeat.stop()
+                coalesced = lease.release(token)
+            if coalesced:
+                logger.info("task.coalesced", extra={"task": name, "coalesced": coalesced})
+            return {**result, "coalesced": coalesced}
+
+        return wrapper
+
+    return decorator
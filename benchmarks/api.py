@@ -0,0 +1,110 @@
+"""
+Latency of `GET /users` pages, served in-process against a seeded database.
+
+Seeds `--users` users with an address and a card (raw payloads included, as
+enrichment stores them), disables the API response cache and walks the list
+with cursor pages of `--rows`, so every request runs the query and the
+serialization. Reports per-request latency (ms) and rows served per second.
+
+    python -m benchmarks.api --rows 100
+    python -m benchmarks.api --users 50000 --rows 100 --requests 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.fake_provider import make_user
+
+
+def _configure_env(args: argparse.Namespace) -> None:
+    """Point the app at a throwaway database before any `app` module is imported."""
+    db_url = args.database_url or f"sqlite+pysqlite:///{tempfile.mkdtemp()}/bench_api.db"
+    os.environ.update(
+        {
+            "DATABASE_URL": db_url,
+            "CELERY_BROKER_URL": "memory://",
+            "CELERY_RESULT_BACKEND": "cache+memory://",
+            "API_CACHE_BACKEND": "none",
+        }
+    )
+
+
+def _seed(users: int, chunk: int = 5_000) -> None:
+    from sqlalchemy import insert
+
+    from app.clients.dummyjson import DummyJSONClient
+    from app.db import engine
+    from app.models import Address, Base, CreditCard, User
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for start in range(1, users + 1, chunk):
+            payloads = [make_user(i) for i in range(start, min(start + chunk, users + 1))]
+            conn.execute(insert(User), [DummyJSONClient.map_user(p) for p in payloads])
+            conn.execute(
+                insert(Address),
+                [{"user_id": p["id"], **DummyJSONClient.map_address(p)} for p in payloads],
+            )
+            conn.execute(
+                insert(CreditCard),
+                [{"user_id": p["id"], **DummyJSONClient.map_credit_card(p)} for p in payloads],
+            )
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one INFO line per request
+    _seed(args.users)
+    latencies: List[float] = []
+    with TestClient(app) as client:
+        params: Dict[str, Any] = {"limit": args.rows}
+        for _ in range(args.warmup + args.requests):
+            started = time.perf_counter()
+            res = client.get("/users", params=params)
+            elapsed = time.perf_counter() - started
+            res.raise_for_status()
+            latencies.append(elapsed)
+            cursor = res.headers.get("X-Next-Cursor")
+            params = {"limit": args.rows, **({"cursor": cursor} if cursor else {})}
+
+    measured = sorted(latencies[args.warmup :])
+    return {
+        "users": args.users,
+        "rows_per_page": args.rows,
+        "requests": len(measured),
+        "p50_ms": round(statistics.median(measured) * 1000, 2),
+        "p95_ms": round(measured[int(len(measured) * 0.95) - 1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(measured) * 1000, 2),
+        "rows_per_sec": round(args.rows * len(measured) / sum(measured)),
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=10_000, help="users seeded")
+    parser.add_argument("--rows", type=int, default=100, help="page size (limit)")
+    parser.add_argument("--requests", type=int, default=300, help="measured requests")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    args = parser.parse_args(argv)
+
+    _configure_env(args)
+    print(json.dumps(run(args), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Local stand-in for the DummyJSON `/users` and `/users/{id}` endpoints.
+
+Users are generated on the fly from their id, so any N costs no memory. Latency
+and error rate are configurable; errors are 503s drawn from a seeded RNG so
+runs are reproducible. Every request is counted for the benchmark report.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+_USER_PATH = re.compile(r"^/users/(\d+)$")
+
+
+def make_user(user_id: int) -> Dict[str, Any]:
+    """Deterministic synthetic user shaped like a DummyJSON payload."""
+    return {
+        "id": user_id,
+        "firstName": f"Bench{user_id}",
+        "lastName": "User",
+        "username": f"bench{user_id}",
+        "email": f"bench{user_id}@example.com",
+        "phone": f"+1 555 {user_id:07d}",
+        "domain": f"bench{user_id}.example.com",
+        "company": {"name": f"Company {user_id % 997}"},
+        "address": {
+            "address": f"{user_id} Benchmark Ave",
+            "city": "Loadtown",
+            "state": "Benchmark",
+            "country": "Testland",
+            "postalCode": f"{user_id % 100000:05d}",
+            "coordinates": {"lat": (user_id % 180) - 90.0, "lng": (user_id % 360) - 180.0},
+        },
+        "bank": {
+            "cardType": ("Visa", "Mastercard", "Amex")[user_id % 3],
+            "cardNumber": f"4111{user_id:012d}",
+            "cardExpire": f"{user_id % 12 + 1:02d}/{30 + user_id % 5}",
+        },
+    }
+
+
+def _project(user: Dict[str, Any], select: Optional[str]) -> Dict[str, Any]:
+    if not select:
+        return user
+    fields = {"id", *select.split(",")}
+    return {k: v for k, v in user.items() if k in fields}
+
+
+class FakeDummyJSON:
+    """Threaded HTTP server serving `total` synthetic users; use as a context manager."""
+
+    def __init__(
+        self,
+        total: int,
+        *,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.total = total
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self) -> "FakeDummyJSON":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            failed = self.error_rate > 0 and self._rng.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    def _handler(self) -> type:
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as two writes; with Nagle on, every reused
+            # keep-alive connection would wait out the client's delayed ACK (~40 ms)
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                if provider.latency:
+                    time.sleep(provider.latency)
+                if provider._should_fail():
+                    return self._send(503, {"message": "injected failure"})
+
+                url = urlsplit(self.path)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                select = query.get("select")
+                if url.path == "/users":
+                    skip = int(query.get("skip", 0))
+                    limit = int(query.get("limit", 30)) or provider.total
+                    ids = range(skip + 1, min(skip + limit, provider.total) + 1)
+                    users = [_project(make_user(i), select) for i in ids]
+                    body = {"users": users, "total": provider.total, "skip": skip, "limit": limit}
+                    return self._send(200, body)
+                match = _USER_PATH.match(url.path)
+                if match and 1 <= int(match.group(1)) <= provider.total:
+                    return self._send(200, _project(make_user(int(match.group(1))), select))
+                return self._send(404, {"message": "not found"})
+
+            def _send(self, status: int, body: Dict[str, Any]) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
@@ -0,0 +1,180 @@
+"""
+End-to-end ingestion benchmark against a local fake DummyJSON provider.
+
+Runs `sync_users`, then `enrich_missing_addresses` and `enrich_missing_cards`
+(in batches until drained) for each requested scale, and reports per phase:
+users/sec, HTTP calls per user and DB statements per user. Results are compared
+with `benchmarks/baselines.json`; the exit status is 1 when any metric regresses
+by more than `--threshold`.
+
+    python -m benchmarks.run --scale 1k --scale 100k
+    python -m benchmarks.run --scale 1k --latency-ms 20 --error-rate 0.01
+    python -m benchmarks.run --scale 1k --update-baseline
+
+Baselines are only comparable on the same machine and database backend.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from benchmarks.fake_provider import FakeDummyJSON
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+BASELINES = Path(__file__).with_name("baselines.json")
+# Higher is better for throughput, lower is better for the per-user costs
+HIGHER_IS_BETTER = {"users_per_sec"}
+
+
+def _configure_env(args: argparse.Namespace, base_url: str) -> None:
+    """Point the app at the fake provider before any `app` module is imported."""
+    db_url = args.database_url or f"sqlite+pysqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ.update(
+        {
+            "DATABASE_URL": db_url,
+            "CELERY_BROKER_URL": "memory://",
+            "CELERY_RESULT_BACKEND": "cache+memory://",
+            "DUMMYJSON_BASE_URL": base_url,
+            "SYNC_INGEST_RELATED": "true" if args.ingest_related else "false",
+            "ENRICH_ON_INSERT": "false",
+            "PROVIDER_RATE_LIMIT": str(args.rate_limit),
+            "HTTP_BACKOFF_FACTOR": "0.05",
+        }
+    )
+
+
+def _phase(
+    name: str, users: int, run: Callable[[], Any], provider: FakeDummyJSON, stats: Dict[str, int]
+) -> Dict[str, Any]:
+    requests_before, statements_before = provider.requests, stats["statements"]
+    started = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - started
+    http_calls = provider.requests - requests_before
+    statements = stats["statements"] - statements_before
+    return {
+        "phase": name,
+        "seconds": round(seconds, 3),
+        "users_per_sec": round(users / seconds, 1) if seconds else 0.0,
+        "http_per_user": round(http_calls / users, 4),
+        "statements_per_user": round(statements / users, 4),
+    }
+
+
+def _drain(task: Callable[..., Dict[str, Any]], batch_size: int) -> None:
+    """Run an enrichment task batch after batch until nothing is left to claim."""
+    while True:
+        result = task(batch_size=batch_size)
+        if not result.get("updated", 0) + result.get("failed", 0):
+            return
+
+
+def run_scale(users: int, args: argparse.Namespace, provider: FakeDummyJSON) -> List[Dict]:
+    from sqlalchemy import event
+
+    from app.clients.dummyjson import get_client
+    from app.clients.ratelimit import get_limiter
+    from app.db import engine
+    from app.models import Base
+    from app.tasks.addresses import enrich_missing_addresses
+    from app.tasks.credit_cards import enrich_missing_cards
+    from app.tasks.users import sync_users
+    from app.utils.cache import get_cache
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    for factory in (get_client, get_cache, get_limiter):
+        factory.cache_clear()
+    provider.total = users
+
+    stats = {"statements": 0}
+
+    def count(*_: Any) -> None:
+        stats["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        return [
+            _phase("sync_users", users, sync_users, provider, stats),
+            _phase(
+                "enrich_missing_addresses",
+                users,
+                lambda: _drain(enrich_missing_addresses, args.enrich_batch),
+                provider,
+                stats,
+            ),
+            _phase(
+                "enrich_missing_cards",
+                users,
+                lambda: _drain(enrich_missing_cards, args.enrich_batch),
+                provider,
+                stats,
+            ),
+        ]
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+
+def compare(
+    results: Dict[str, List[Dict]], baselines: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Human-readable regressions of `results` against `baselines` beyond `threshold`."""
+    regressions = []
+    for scale, phases in results.items():
+        expected = {p["phase"]: p for p in baselines.get(scale, [])}
+        for phase in phases:
+            base = expected.get(phase["phase"])
+            if base is None:
+                continue
+            for metric in ("users_per_sec", "http_per_user", "statements_per_user"):
+                old, new = base[metric], phase[metric]
+                if metric in HIGHER_IS_BETTER:
+                    worse = new < old * (1 - threshold)
+                else:
+                    worse = new > old * (1 + threshold) + 1e-9
+                if worse:
+                    regressions.append(f"{scale} {phase['phase']} {metric}: {old} -> {new}")
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES), help="repeatable")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake provider latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 responses")
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    parser.add_argument("--enrich-batch", type=int, default=1000, help="users per enrichment run")
+    parser.add_argument("--rate-limit", type=float, default=0, help="PROVIDER_RATE_LIMIT")
+    parser.add_argument("--ingest-related", action="store_true", help="SYNC_INGEST_RELATED")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression")
+    parser.add_argument("--baseline", type=Path, default=BASELINES)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+    scales = args.scale or ["1k"]
+
+    with FakeDummyJSON(0, latency_ms=args.latency_ms, error_rate=args.error_rate) as provider:
+        _configure_env(args, provider.base_url)
+        results = {scale: run_scale(SCALES[scale], args, provider) for scale in scales}
+
+    print(json.dumps(results, indent=2))
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.update_baseline:
+        baselines.update(results)
+        args.baseline.write_text(json.dumps(baselines, indent=2) + "\n")
+        return 0
+
+    regressions = compare(results, baselines, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,42 @@
 import os
+import tempfile
 
 import pytest
 import responses as responses_lib
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
+from app.api.routes_users import get_db, get_sessionmaker
+from app.db import async_database_url
 from app.main import app
 from app.models import Base
+from app.settings import get_settings
 
-TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "sqlite+pysqlite:///:memory:")
+# Tasks (sync) and the API (async) must see the same committed rows, so the default is
+# a throwaway SQLite file: an in-memory database is private to one connection.
+TEST_DATABASE_URL = os.getenv(
+    "TEST_DATABASE_URL", f"sqlite+pysqlite:///{tempfile.mkdtemp()}/test.db"
+)
 
 engine = create_engine(TEST_DATABASE_URL, future=True)
 TestingSessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+# NullPool: each TestClient runs its own event loop, pooled connections would outlive it
+async_engine = create_async_engine(
+    async_database_url(
+        get_settings().model_copy(
+            update={"database_url": TEST_DATABASE_URL, "async_database_url": None}
+        )
+    ),
+    poolclass=NullPool,
+)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, expire_on_commit=False, class_=AsyncSession
+)
+
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_database():
@@ -25,16 +48,20 @@ def setup_database():
 
 @pytest.fixture(scope="function")
 def db_session():
-    """Provide a fresh database session for each test function."""
-    connection = engine.connect()
-    transaction = connection.begin()
-    session = TestingSessionLocal(bind=connection)
+    """
+    Provide a fresh database session for each test function.
+
+    Commits are real, so tasks and API requests (own connections) see the data;
+    every table is emptied afterwards instead of rolling back.
+    """
+    session = TestingSessionLocal()
     try:
         yield session
     finally:
         session.close()
-        transaction.rollback()
-        connection.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(delete(table))
 
 
 @pytest.fixture(autouse=True)
@@ -49,11 +76,45 @@ def patch_sessionlocal(monkeypatch, db_session):
     yield
 
 
+@pytest.fixture(autouse=True)
+def reset_client_state():
+    """Drop process-wide provider caches/limiters so no state leaks between tests."""
+    from app.clients.dummyjson import get_client
+    from app.clients.ratelimit import get_limiter
+    from app.utils.cache import get_cache
+    from app.utils.lock import get_lease
+
+    get_client.cache_clear()
+    get_cache.cache_clear()
+    get_limiter.cache_clear()
+    get_lease.cache_clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def disable_enrich_on_insert(monkeypatch):
+    """Keep sync_users from queueing enrichment; tests that cover it opt back in."""
+    from app.settings import get_settings
+
+    monkeypatch.setattr(get_settings(), "enrich_on_insert", False)
+    yield
+
+
+async def _get_test_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 @pytest.fixture(scope="function")
 def client(db_session):
-    """FastAPI test client (якщо знадобиться для API-тестів)."""
-    with TestClient(app) as test_client:
-        yield test_client
+    """FastAPI test client (якщо знадобиться для API-тестів), reading the test database."""
+    app.dependency_overrides[get_db] = _get_test_db
+    app.dependency_overrides[get_sessionmaker] = lambda: TestingAsyncSessionLocal
+    try:
+        with TestClient(app) as test_client:
+            yield test_client
+    finally:
+        app.dependency_overrides.clear()
 
 
 @pytest.fixture
@@ -1,4 +1,5 @@
 import itertools
+import json
 
 from sqlalchemy.orm import Session
 
@@ -56,6 +57,17 @@ def test_healthz(client):
     assert res.json() == {"status": "ok"}
 
 
+def test_metrics_endpoint_exposes_route_latency(client):
+    """/metrics serves Prometheus text including latency of earlier requests by route."""
+    client.get("/healthz")
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/healthz",status="200"}' in (
+        res.text
+    )
+
+
 def test_users_list(client):
     """Ensure /users returns a list (may be empty or prepopulated)."""
     res = client.get("/users")
@@ -83,6 +95,110 @@ def test_users_list_with_filters(client, db_session):
     assert u2.id in ids
 
 
+def test_users_list_cursor_pagination(client, db_session):
+    """Cursor pages walk users in id order, keep filters and stop without a next cursor."""
+    with_address = [create_sample_user(db_session, with_address=True).id for _ in range(3)]
+    create_sample_user(db_session)
+
+    seen, params = [], {"limit": 2, "has_address": True}
+    while True:
+        res = client.get("/users", params=params)
+        assert res.status_code == 200
+        seen += [u["id"] for u in res.json()]
+        cursor = res.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params["cursor"] = cursor
+
+    assert seen == with_address
+    assert len(params) == 3  # more than one page was walked
+
+    assert client.get("/users", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_get_user_etag_not_modified(client, db_session):
+    """A matching If-None-Match gets an empty 304 until a write batch bumps the version."""
+    from app.utils.data_version import bump_data_version
+
+    user = create_sample_user(db_session)
+    first = client.get(f"/users/{user.id}")
+    etag = first.headers["ETag"]
+
+    res = client.get(f"/users/{user.id}", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.content == b""
+
+    user.name = "Renamed"
+    bump_data_version(db_session)
+    db_session.commit()
+    res = client.get(f"/users/{user.id}", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.json()["name"] == "Renamed"
+
+
+def test_projection_matches_validated_user_out(db_session):
+    """The Core projection serializes exactly what UserOut would, cards masked."""
+    from app.api.projection import dump_users, users_projection
+    from app.schemas import UserOut
+
+    users = [
+        create_sample_user(db_session, with_address=True, with_card=True),
+        create_sample_user(db_session),
+    ]
+    rows = db_session.execute(
+        users_projection().where(User.id.in_([u.id for u in users])).order_by(User.id)
+    ).all()
+
+    expected = []
+    for user in users:
+        db_session.refresh(user)
+        out = UserOut.model_validate(user).model_dump(mode="json")
+        if out["credit_card"]:
+            out["credit_card"]["cc_number"] = "**** **** **** 1111"
+        expected.append(out)
+    assert json.loads(dump_users(rows)) == expected
+
+
+def test_export_encoders_mask_cards(db_session):
+    """NDJSON lines are UserOut objects and CSV rows are flat columns, both with masked cards."""
+    from app.api.projection import CSV_COLUMNS, dump_csv, dump_ndjson, users_projection
+
+    user = create_sample_user(db_session, with_address=True, with_card=True)
+    rows = db_session.execute(users_projection().where(User.id == user.id)).all()
+
+    (line,) = dump_ndjson(rows).decode().splitlines()
+    assert json.loads(line)["credit_card"]["cc_number"] == "**** **** **** 1111"
+
+    header, row = dump_csv(rows, header=True).decode().splitlines()
+    record = dict(zip(CSV_COLUMNS, row.split(","), strict=True))
+    assert header.split(",") == CSV_COLUMNS
+    assert record["id"] == str(user.id)
+    assert record["card_cc_number"] == "**** **** **** 1111"
+    assert "4111111111111111" not in row
+
+
+def test_users_export_streams_incremental_ndjson(client, db_session):
+    """GET /users/export streams every user, or only those changed since `updated_since`."""
+    from datetime import datetime, timedelta
+
+    untouched = create_sample_user(db_session, with_card=True)
+    old = create_sample_user(db_session)
+    since = datetime.utcnow() + timedelta(seconds=1)
+    old.name = "Changed later"
+    old.updated_at = since + timedelta(seconds=1)
+    db_session.commit()
+
+    res = client.get("/users/export")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert [u["id"] for u in lines] == [untouched.id, old.id]
+    assert lines[0]["credit_card"]["cc_number"] != "4111111111111111"
+
+    res = client.get("/users/export", params={"updated_since": since.isoformat()})
+    assert [json.loads(line)["name"] for line in res.text.splitlines()] == ["Changed later"]
+
+
 def test_get_user_success(client, db_session):
     user = create_sample_user(db_session, with_card=True)
     res = client.get(f"/users/{user.id}")
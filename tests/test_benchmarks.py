@@ -0,0 +1,60 @@
+import requests
+
+from benchmarks.fake_provider import FakeDummyJSON
+from benchmarks.run import compare
+
+
+def test_fake_provider_serves_pages_projections_and_single_users():
+    """The stand-in should page, project and count requests like DummyJSON."""
+    with FakeDummyJSON(5) as provider:
+        page = requests.get(
+            f"{provider.base_url}/users", params={"limit": 2, "skip": 4, "select": "firstName"}
+        ).json()
+        user = requests.get(f"{provider.base_url}/users/3").json()
+        missing = requests.get(f"{provider.base_url}/users/6")
+
+    assert page["total"] == 5
+    assert page["users"] == [{"id": 5, "firstName": "Bench5"}]
+    assert user["address"]["address"] == "3 Benchmark Ave"
+    assert missing.status_code == 404
+    assert provider.requests == 3
+
+
+def test_compare_flags_only_regressions_beyond_threshold():
+    """Throughput may not drop and per-user costs may not grow by more than the threshold."""
+    base = {
+        "1k": [
+            {
+                "phase": "sync_users",
+                "users_per_sec": 100.0,
+                "http_per_user": 0.01,
+                "statements_per_user": 0.03,
+            }
+        ]
+    }
+    ok = {
+        "1k": [
+            {
+                "phase": "sync_users",
+                "users_per_sec": 85.0,
+                "http_per_user": 0.01,
+                "statements_per_user": 0.035,
+            }
+        ]
+    }
+    slow = {
+        "1k": [
+            {
+                "phase": "sync_users",
+                "users_per_sec": 70.0,
+                "http_per_user": 1.0,
+                "statements_per_user": 0.03,
+            }
+        ]
+    }
+
+    assert compare(ok, base, 0.2) == []
+    assert compare(slow, base, 0.2) == [
+        "1k sync_users users_per_sec: 100.0 -> 70.0",
+        "1k sync_users http_per_user: 0.01 -> 1.0",
+    ]
@@ -0,0 +1,314 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.clients.dummyjson import DummyJSONClient, DummyJSONConfig
+
+
+class _UsersHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps({"id": 1, "firstName": "Keep", "lastName": "Alive"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_provider():
+    """Local keep-alive HTTP server standing in for DummyJSON."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _UsersHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_reuses_pooled_connections(local_provider):
+    """Clients built with the same transport config share one keep-alive pool."""
+    config = DummyJSONConfig(base_url=local_provider, timeout=5, pool_size=2, max_retries=0)
+    first, second = DummyJSONClient(config), DummyJSONClient(config)
+    before = first.connection_stats()
+
+    for client in (first, second, first):
+        assert client.get_user(1)["firstName"] == "Keep"
+
+    after = second.connection_stats()
+    assert after["requests"] - before["requests"] == 3
+    assert after["connections_opened"] - before["connections_opened"] == 1
+
+
+def test_async_client_fetches_many_users_with_bounded_concurrency():
+    """get_users_many keeps input order and never exceeds the concurrency limit."""
+    import asyncio
+
+    import httpx
+
+    from app.clients.dummyjson_async import AsyncDummyJSONClient
+
+    in_flight = peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        user_id = int(request.url.path.rsplit("/", 1)[-1])
+        return httpx.Response(200, json={"id": user_id, "firstName": f"U{user_id}"})
+
+    async def run():
+        config = DummyJSONConfig(base_url="https://dummyjson.com", timeout=5)
+        transport = httpx.MockTransport(handler)
+        async with AsyncDummyJSONClient(config, concurrency=3, transport=transport) as client:
+            users = await client.get_users_many(range(1, 11))
+            return [client.map_user(u) for u in users]
+
+    mapped = asyncio.run(run())
+
+    assert [m["external_id"] for m in mapped] == list(range(1, 11))
+    assert mapped[0]["name"] == "U1"
+    assert peak <= 3
+
+
+def test_client_requests_only_projected_fields(mock_responses):
+    """get_user / list_users should forward the mapper's fields as DummyJSON `select=`."""
+    import responses
+
+    mock_responses.add(
+        responses.GET,
+        "https://dummyjson.com/users/7",
+        match=[responses.matchers.query_param_matcher({"select": "address"})],
+        json={"id": 7, "address": {"city": "Projected"}},
+    )
+    mock_responses.add(
+        responses.GET,
+        "https://dummyjson.com/users",
+        match=[
+            responses.matchers.query_param_matcher(
+                {"limit": "5", "skip": "0", "select": ",".join(DummyJSONClient.USER_FIELDS)}
+            )
+        ],
+        json={"users": [], "total": 0},
+    )
+    client = DummyJSONClient(DummyJSONConfig(base_url="https://dummyjson.com", timeout=5))
+
+    user = client.get_user(7, select=client.ADDRESS_FIELDS)
+    assert client.map_address(user)["city"] == "Projected"
+    assert client.list_users(limit=5, select=client.USER_FIELDS) == ([], 0)
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used(monkeypatch):
+    """TTLCache drops expired entries and the least recently used key when full."""
+    from app.utils import cache as cache_module
+
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = cache_module.TTLCache(maxsize=2, ttl=10)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.stats() == {"backend": "memory", "hits": 1, "misses": 2}
+
+
+def test_async_client_retries_throttled_and_server_errors_like_the_sync_client():
+    """429/5xx are retried up to max_retries with backoff; other 4xx raise at once."""
+    import asyncio
+
+    import httpx
+
+    from app.clients.dummyjson_async import AsyncDummyJSONClient
+
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        user_id = int(request.url.path.rsplit("/", 1)[-1])
+        calls.append(user_id)
+        if user_id == 1 and calls.count(1) < 3:
+            return httpx.Response(503 if calls.count(1) == 1 else 429, json={})
+        if user_id == 2:
+            return httpx.Response(404, json={"message": "not found"})
+        return httpx.Response(200, json={"id": user_id})
+
+    async def run():
+        config = DummyJSONConfig(
+            base_url="https://dummyjson.com", timeout=5, max_retries=3, backoff_factor=0
+        )
+        transport = httpx.MockTransport(handler)
+        async with AsyncDummyJSONClient(config, transport=transport) as client:
+            user = await client.get_user(1)
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.get_user(2)
+            return user
+
+    assert asyncio.run(run()) == {"id": 1}
+    assert calls == [1, 1, 1, 2]
+
+
+def test_adaptive_limiter_backs_off_on_throttling_and_recovers(monkeypatch):
+    """429s halve concurrency and rate; successful fast responses grow them back."""
+    from app.clients import ratelimit
+
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    bucket = ratelimit.LocalTokenBucket(rate=20, burst=20)
+    limiter = ratelimit.AdaptiveLimiter(bucket, max_rate=20, max_concurrency=8, latency_target=1.0)
+
+    limiter.acquire()
+    limiter.release(429, 0.1)
+    assert limiter.snapshot()["concurrency_limit"] == 4
+    assert bucket.rate == 10
+
+    limiter.acquire()
+    limiter.release(200, 0.1, retried_statuses=[503])  # retried 5xx still counts
+    assert bucket.rate == 10  # within the decrease cooldown
+
+    now[0] += 2
+    for _ in range(8):
+        limiter.acquire()
+        limiter.release(200, 0.1)
+    snapshot = limiter.snapshot()
+    assert snapshot["concurrency_limit"] > 4
+    assert snapshot["rate"] == 11
+    assert snapshot["throttled"] == 2
+
+
+def test_adaptive_limiters_sharing_a_bucket_only_lower_the_shared_rate(monkeypatch):
+    """A throttle halves the current shared rate, not a worker's stale copy of it."""
+    from app.clients import ratelimit
+
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    bucket = ratelimit.LocalTokenBucket(rate=20, burst=20)
+    worker_a, worker_b = (
+        ratelimit.AdaptiveLimiter(bucket, max_rate=20, max_concurrency=8, latency_target=1.0)
+        for _ in range(2)
+    )
+
+    for _ in range(3):
+        worker_b.acquire()
+        worker_b.release(429, 0.1)
+        now[0] += 2
+    assert bucket.rate == 2.5
+
+    worker_a.acquire()
+    worker_a.release(429, 0.1)
+    assert bucket.rate == 1.25
+    assert worker_a.snapshot()["rate"] == worker_b.snapshot()["rate"] == 1.25
+
+
+def test_adaptive_limiter_adjusts_shared_rate_outside_its_lock():
+    """The rate step (a Redis round trip when shared) must not block other threads' acquire."""
+    import threading
+
+    from app.clients import ratelimit
+
+    class ProbingBucket(ratelimit.LocalTokenBucket):
+        lock_free: list = []
+
+        def adjust_rate(self, factor, step, *, low, high):
+            probe = threading.Thread(target=self._probe)
+            probe.start()
+            probe.join()
+            return super().adjust_rate(factor, step, low=low, high=high)
+
+        def _probe(self):
+            acquired = limiter._cond.acquire(timeout=1)
+            if acquired:
+                limiter._cond.release()
+            self.lock_free.append(acquired)
+
+    bucket = ProbingBucket(rate=20, burst=20)
+    limiter = ratelimit.AdaptiveLimiter(bucket, max_rate=20, max_concurrency=8, latency_target=1.0)
+    limiter.acquire()
+    limiter.release(429, 0.1)
+
+    assert bucket.lock_free == [True]
+    assert bucket.rate == 10
+
+
+def test_local_token_bucket_reports_wait_when_empty(monkeypatch):
+    from app.clients import ratelimit
+
+    now = [0.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    bucket = ratelimit.LocalTokenBucket(rate=2, burst=1)
+
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(0.5)
+    now[0] += 0.5
+    assert bucket.try_acquire() == 0
+
+
+def test_iter_users_streams_pages_and_reports_timing(mock_responses):
+    """iter_users walks every page, maps users lazily and reports per-page timing."""
+    import responses
+
+    for skip, ids in ((0, [1, 2]), (2, [3])):
+        mock_responses.add(
+            responses.GET,
+            "https://dummyjson.com/users",
+            match=[responses.matchers.query_param_matcher({"limit": "2", "skip": str(skip)})],
+            json={
+                "users": [{"id": i, "firstName": f"S{i}", "address": {"lat": 1.5}} for i in ids],
+                "total": 3,
+            },
+        )
+    client = DummyJSONClient(DummyJSONConfig(base_url="https://dummyjson.com", timeout=5))
+    pages = []
+
+    users = client.iter_users(page_size=2, on_page=pages.append)
+    first = next(users)
+    assert first["name"] == "S1"
+    assert len(mock_responses.calls) == 1  # second page not requested yet
+
+    assert [u["external_id"] for u in users] == [2, 3]
+    assert [(p.skip, p.users) for p in pages] == [(0, 2), (2, 1)]
+    assert all(p.seconds >= 0 for p in pages)
+
+
+def test_worker_process_init_rebuilds_process_resources():
+    """A forked worker child should get a fresh client and HTTP pool, not the parent's."""
+    from app.celery_app import reset_process_resources
+    from app.clients import dummyjson
+
+    parent_client = dummyjson.get_client()
+    parent_session = parent_client._session
+    assert dummyjson.get_client() is parent_client
+
+    reset_process_resources()
+
+    child_client = dummyjson.get_client()
+    assert child_client is not parent_client
+    assert child_client._session is not parent_session
+
+
+def test_client_records_latency_per_endpoint(local_provider):
+    """Provider requests are observed under a templated endpoint label with their status."""
+    from prometheus_client import REGISTRY
+
+    labels = {"provider": "dummyjson", "endpoint": "/users/{id}", "status": "200"}
+    before = REGISTRY.get_sample_value("provider_request_duration_seconds_count", labels) or 0
+    client = DummyJSONClient(DummyJSONConfig(base_url=local_provider, timeout=5, max_retries=0))
+
+    client.get_user(7)
+    client.get_user(8)
+
+    assert REGISTRY.get_sample_value("provider_request_duration_seconds_count", labels) == (
+        before + 2
+    )
@@ -1,11 +1,18 @@
 import re
+from datetime import datetime, timedelta
 
 import pytest
 import responses
 
 from app.models import Address, CreditCard, User
-from app.tasks.addresses import enrich_missing_addresses
+from app.tasks import addresses
+from app.tasks.addresses import (
+    enrich_address_shard,
+    enrich_missing_addresses,
+    enrich_missing_addresses_sharded,
+)
 from app.tasks.credit_cards import enrich_missing_cards
+from app.tasks.enrichment import claim_users_missing, plan_shards
 from app.tasks.users import sync_users
 
 
@@ -40,6 +47,180 @@ def test_sync_users_task(db_session, mock_responses):
     assert saved.username == "jane" or (saved.name and saved.name.startswith("Jane"))
 
 
+@pytest.mark.usefixtures("mock_responses")
+def test_sync_users_task_paginates_with_bulk_upsert(db_session, mock_responses, monkeypatch):
+    """sync_users should walk every page and report throughput in its result."""
+    from app.settings import get_settings
+
+    monkeypatch.setattr(get_settings(), "users_page_size", 2)
+
+    def page(skip):
+        ids = [u for u in range(300, 305)][skip : skip + 2]
+        return {"users": [{"id": i, "firstName": f"U{i}"} for i in ids], "total": 5}
+
+    for skip in (0, 2, 4):
+        mock_responses.add(
+            responses.GET,
+            "https://dummyjson.com/users",
+            match=[
+                responses.matchers.query_param_matcher(
+                    {"limit": "2", "skip": str(skip)}, strict_match=False
+                )
+            ],
+            json=page(skip),
+            status=200,
+        )
+
+    result = sync_users()
+
+    assert result["synced"] == 5
+    assert result["rows_per_sec"] > 0
+    saved = db_session.query(User).filter(User.external_id.between(300, 304)).all()
+    assert sorted(u.name for u in saved) == ["U300", "U301", "U302", "U303", "U304"]
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_sync_users_task_propagates_prefetch_errors(db_session, mock_responses, monkeypatch):
+    """A failed background page fetch should surface so Celery can retry the task."""
+    from requests import RequestException
+
+    from app.settings import get_settings
+
+    monkeypatch.setattr(get_settings(), "users_page_size", 1)
+    mock_responses.add(
+        responses.GET,
+        "https://dummyjson.com/users",
+        match=[
+            responses.matchers.query_param_matcher({"limit": "1", "skip": "0"}, strict_match=False)
+        ],
+        json={"users": [{"id": 310, "firstName": "First"}], "total": 2},
+        status=200,
+    )
+    mock_responses.add(
+        responses.GET,
+        "https://dummyjson.com/users",
+        match=[
+            responses.matchers.query_param_matcher({"limit": "1", "skip": "1"}, strict_match=False)
+        ],
+        status=503,
+    )
+
+    with pytest.raises(RequestException):
+        sync_users()
+
+    assert db_session.query(User).filter_by(external_id=310).first() is not None
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_sync_users_task_skips_unchanged_users(db_session, mock_responses):
+    """Re-running sync_users should only rewrite users whose mapped content changed."""
+    users = [
+        {"id": 320, "firstName": "Same", "email": "same@example.com"},
+        {"id": 321, "firstName": "Before", "email": "changed@example.com"},
+    ]
+    url = re.compile(r"https://dummyjson\.com/users(\?.*)?$")
+    mock_responses.add(responses.GET, url, json={"users": users, "total": 2}, status=200)
+
+    first = sync_users()
+    assert (first["inserted"], first["updated"], first["unchanged"]) == (2, 0, 0)
+    same_before = db_session.query(User).filter_by(external_id=320).one().updated_at
+
+    mock_responses.replace(
+        responses.GET,
+        url,
+        json={"users": [users[0], {**users[1], "firstName": "After"}], "total": 2},
+        status=200,
+    )
+    second = sync_users()
+    db_session.expire_all()
+
+    assert (second["inserted"], second["updated"], second["unchanged"]) == (0, 1, 1)
+    assert db_session.query(User).filter_by(external_id=321).one().name == "After"
+    assert db_session.query(User).filter_by(external_id=320).one().updated_at == same_before
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_sync_users_task_bumps_data_version_only_when_rows_change(db_session, mock_responses):
+    """Pages that write rows bump the API cache version; an unchanged re-sync keeps it."""
+    from app.models import DataVersion
+
+    url = re.compile(r"https://dummyjson\.com/users(\?.*)?$")
+    users = [
+        {
+            "id": 330,
+            "firstName": "Versioned",
+            "email": "v@example.com",
+            "address": {"address": "1 One St", "city": "Onetown"},
+            "bank": {"cardType": "Visa", "cardNumber": "4000", "cardExpire": "01/30"},
+        }
+    ]
+    mock_responses.add(responses.GET, url, json={"users": users, "total": 1}, status=200)
+
+    def version():
+        db_session.expire_all()
+        row = db_session.get(DataVersion, "users")
+        return row.version if row else 0
+
+    before = version()
+    sync_users()
+    after_insert = version()
+    resynced = sync_users()
+
+    assert after_insert == before + 1
+    assert version() == after_insert
+    assert (resynced["addresses"], resynced["cards"]) == (0, 0)
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_sync_users_task_ingests_address_and_card(db_session, mock_responses):
+    """sync_users should store address and card from the list payload without extra calls."""
+    mock_responses.add(
+        responses.GET,
+        re.compile(r"https://dummyjson\.com/users(\?.*)?$"),
+        json={
+            "users": [
+                {
+                    "id": 330,
+                    "firstName": "Full",
+                    "address": {"address": "1 One St", "city": "Onetown"},
+                    "bank": {"cardType": "Visa", "cardNumber": "4000", "cardExpire": "01/30"},
+                }
+            ],
+            "total": 1,
+        },
+        status=200,
+    )
+
+    result = sync_users()
+
+    user = db_session.query(User).filter_by(external_id=330).one()
+    assert (result["addresses"], result["cards"]) == (1, 1)
+    assert db_session.query(Address).filter_by(user_id=user.id).one().city == "Onetown"
+    assert db_session.query(CreditCard).filter_by(user_id=user.id).one().exp_year == 2030
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_sync_users_task_streaming_mode(db_session, mock_responses, monkeypatch):
+    """With SYNC_STREAMING, sync_users writes streamed users in UPSERT_CHUNK_SIZE batches."""
+    from app.settings import get_settings
+
+    monkeypatch.setattr(get_settings(), "sync_streaming", True)
+    monkeypatch.setattr(get_settings(), "users_page_size", 3)
+    monkeypatch.setattr(get_settings(), "upsert_chunk_size", 2)
+    mock_responses.add(
+        responses.GET,
+        re.compile(r"https://dummyjson\.com/users(\?.*)?$"),
+        json={"users": [{"id": i, "firstName": f"Stream{i}"} for i in (340, 341, 342)], "total": 3},
+        status=200,
+    )
+
+    result = sync_users()
+
+    assert result["synced"] == 3
+    saved = db_session.query(User).filter(User.external_id.between(340, 342)).count()
+    assert saved == 3
+
+
 @pytest.mark.usefixtures("mock_responses")
 def test_enrich_missing_addresses_task(db_session, mock_responses):
     """enrich_missing_addresses should attach address from DummyJSON user details."""
@@ -52,7 +233,7 @@ def test_enrich_missing_addresses_task(db_session, mock_responses):
 
     mock_responses.add(
         responses.GET,
-        re.compile(r"https://dummyjson\.com/users/50$"),
+        re.compile(r"https://dummyjson\.com/users/50(\?.*)?$"),
         json={
             "id": 50,
             "firstName": "A",
@@ -91,7 +272,7 @@ def test_enrich_missing_cards_task(db_session, mock_responses):
 
     mock_responses.add(
         responses.GET,
-        re.compile(r"https://dummyjson\.com/users/51$"),
+        re.compile(r"https://dummyjson\.com/users/51(\?.*)?$"),
         json={
             "id": 51,
             "firstName": "C",
@@ -113,3 +294,368 @@ def test_enrich_missing_cards_task(db_session, mock_responses):
     assert saved.cc_number.endswith("4444")
     assert 1 <= saved.exp_month <= 12
     assert saved.exp_year >= 2025
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_enrich_missing_addresses_task_batches_users(db_session, mock_responses):
+    """enrich_missing_addresses should fetch a batch concurrently and write it in one go."""
+    db_session.query(Address).delete()
+    db_session.query(User).delete()
+    db_session.commit()
+
+    users = [User(external_id=ext_id, name=f"Batch {ext_id}") for ext_id in (60, 61, 62)]
+    db_session.add_all(users)
+    db_session.commit()
+
+    for ext_id in (60, 61, 62):
+        mock_responses.add(
+            responses.GET,
+            re.compile(rf"https://dummyjson\.com/users/{ext_id}(\?.*)?$"),
+            json={"id": ext_id, "address": {"address": f"{ext_id} Batch St", "city": "Batch"}},
+            status=200,
+        )
+
+    result = enrich_missing_addresses(batch_size=10)
+
+    assert result["updated"] == 3
+    saved = db_session.query(Address).filter(Address.user_id.in_([u.id for u in users])).all()
+    assert sorted(a.street for a in saved) == ["60 Batch St", "61 Batch St", "62 Batch St"]
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_enrich_missing_addresses_task_claims_one_batch_at_a_time(
+    db_session, mock_responses, monkeypatch
+):
+    """Leases should be taken per write batch, so none has to outlive the whole run."""
+    from app.settings import get_settings
+
+    db_session.query(Address).delete()
+    db_session.query(User).delete()
+    db_session.commit()
+
+    users = [User(external_id=ext_id, name=f"Lease {ext_id}") for ext_id in (63, 64, 65)]
+    db_session.add_all(users)
+    db_session.commit()
+
+    for ext_id in (63, 64, 65):
+        mock_responses.add(
+            responses.GET,
+            re.compile(rf"https://dummyjson\.com/users/{ext_id}(\?.*)?$"),
+            json={"id": ext_id, "address": {"address": f"{ext_id} Lease St", "city": "Lease"}},
+            status=200,
+        )
+    monkeypatch.setattr(get_settings(), "upsert_chunk_size", 2)
+    claims = []
+
+    def claim(*args, **kwargs):
+        claimed = claim_users_missing(*args, **kwargs)
+        claims.append((kwargs["limit"], [ext_id for _, ext_id in claimed]))
+        return claimed
+
+    monkeypatch.setattr(addresses, "claim_users_missing", claim)
+
+    result = enrich_missing_addresses()
+
+    assert result["updated"] == 3
+    assert claims == [(2, [63, 64]), (2, [65])]
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_enrichment_tasks_share_cached_user_payload(db_session, mock_responses):
+    """Address and card enrichment for the same user should download it only once."""
+    db_session.query(Address).delete()
+    db_session.query(CreditCard).delete()
+    db_session.query(User).delete()
+    db_session.commit()
+
+    user = User(external_id=70, name="Cached")
+    db_session.add(user)
+    db_session.commit()
+
+    mock_responses.add(
+        responses.GET,
+        re.compile(r"https://dummyjson\.com/users/70(\?.*)?$"),
+        json={
+            "id": 70,
+            "address": {"address": "70 Cache Rd", "city": "Hitville"},
+            "bank": {"cardType": "Visa", "cardNumber": "4242", "cardExpire": "02/29"},
+        },
+        status=200,
+    )
+
+    enrich_missing_addresses()
+    enrich_missing_cards()
+
+    assert len(mock_responses.calls) == 1
+    assert db_session.query(Address).filter_by(user_id=user.id).one().city == "Hitville"
+    assert db_session.query(CreditCard).filter_by(user_id=user.id).one().cc_type == "Visa"
+
+
+def test_plan_shards_splits_ids_into_inclusive_ranges():
+    """plan_shards should cover every id exactly once in ranges of shard_size users."""
+    assert plan_shards([1, 2, 5, 9, 10], 2) == [(1, 2), (5, 9), (10, 10)]
+    assert plan_shards([], 2) == []
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_enrich_address_shard_only_touches_its_id_range(db_session, mock_responses):
+    """A shard should enrich users inside its id range and leave the others alone."""
+    db_session.query(Address).delete()
+    db_session.query(User).delete()
+    db_session.commit()
+
+    users = [User(external_id=ext_id, name=f"Shard {ext_id}") for ext_id in (80, 81, 82)]
+    db_session.add_all(users)
+    db_session.commit()
+
+    for ext_id in (80, 81):
+        mock_responses.add(
+            responses.GET,
+            re.compile(rf"https://dummyjson\.com/users/{ext_id}(\?.*)?$"),
+            json={"id": ext_id, "address": {"address": f"{ext_id} Shard St", "city": "Shard"}},
+            status=200,
+        )
+
+    result = enrich_address_shard(users[0].id, users[1].id)
+
+    assert result == {"status": "ok", "updated": 2, "failed": 0}
+    assert db_session.query(Address).filter_by(user_id=users[2].id).one_or_none() is None
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_enrich_missing_addresses_sharded_fans_out(db_session, mock_responses, monkeypatch):
+    """The coordinator should split the backlog into shards and run each one."""
+    from app.celery_app import celery
+
+    monkeypatch.setattr(celery.conf, "task_always_eager", True)
+    db_session.query(Address).delete()
+    db_session.query(User).delete()
+    db_session.commit()
+
+    users = [User(external_id=ext_id, name=f"Fan {ext_id}") for ext_id in (90, 91, 92)]
+    db_session.add_all(users)
+    db_session.commit()
+
+    for ext_id in (90, 91, 92):
+        mock_responses.add(
+            responses.GET,
+            re.compile(rf"https://dummyjson\.com/users/{ext_id}(\?.*)?$"),
+            json={"id": ext_id, "address": {"address": f"{ext_id} Fan St", "city": "Fan"}},
+            status=200,
+        )
+
+    result = enrich_missing_addresses_sharded(shard_size=2)
+
+    assert result == {"status": "dispatched", "users": 3, "shards": 2}
+    saved = db_session.query(Address).filter(Address.user_id.in_([u.id for u in users])).all()
+    assert sorted(a.street for a in saved) == ["90 Fan St", "91 Fan St", "92 Fan St"]
+
+
+def test_claim_users_missing_hands_out_disjoint_leases(db_session):
+    """Concurrent claims should not overlap, and an expired lease can be claimed again."""
+    db_session.query(Address).delete()
+    db_session.query(User).delete()
+    db_session.commit()
+
+    users = [User(external_id=ext_id, name=f"Claim {ext_id}") for ext_id in (100, 101, 102)]
+    db_session.add_all(users)
+    db_session.commit()
+
+    first = claim_users_missing(
+        Address, "address_claimed_until", limit=2, lease_seconds=60, max_failures=3
+    )
+    second = claim_users_missing(
+        Address, "address_claimed_until", limit=2, lease_seconds=60, max_failures=3
+    )
+    assert [ext_id for _, ext_id in first] == [100, 101]
+    assert [ext_id for _, ext_id in second] == [102]
+    assert (
+        claim_users_missing(
+            Address, "address_claimed_until", limit=2, lease_seconds=60, max_failures=3
+        )
+        == []
+    )
+
+    db_session.query(User).filter_by(external_id=101).update(
+        {"address_claimed_until": datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db_session.commit()
+    third = claim_users_missing(
+        Address, "address_claimed_until", limit=2, lease_seconds=60, max_failures=3
+    )
+    assert [ext_id for _, ext_id in third] == [101]
+
+
+def test_periodic_task_skips_while_another_run_holds_the_lease(db_session, monkeypatch):
+    """An overlapping run should be skipped and counted in the lease holder's result."""
+    from app.utils.lock import get_lease, single_flight
+
+    lease = get_lease("sync_users", ttl=120, redis_url=None)
+    token = lease.acquire()
+    assert sync_users() == {"status": "skipped", "reason": "already_running", "skipped": 1}
+    assert lease.release(token) == 1
+
+    @single_flight("noop")
+    def noop():
+        assert noop() == {"status": "skipped", "reason": "already_running", "skipped": 1}
+        return {"status": "ok"}
+
+    assert noop() == {"status": "ok", "coalesced": 1}
+
+
+def test_lease_without_redis_warns_it_is_per_process(caplog):
+    """The in-process lease fallback should be logged, once per lease."""
+    from app.utils.lock import LocalLease, get_lease
+
+    with caplog.at_level("WARNING", logger="app.utils.lock"):
+        lease = get_lease("warn_me", ttl=120, redis_url=None)
+        assert get_lease("warn_me", ttl=120, redis_url=None) is lease
+
+    assert isinstance(lease, LocalLease)
+    assert [r.message for r in caplog.records] == ["lease.local_fallback"]
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_sync_users_task_enriches_newly_inserted_users(db_session, mock_responses, monkeypatch):
+    """With ENRICH_ON_INSERT, new users lacking related rows are enriched right after sync."""
+    from app.celery_app import celery
+    from app.settings import get_settings
+
+    monkeypatch.setattr(get_settings(), "enrich_on_insert", True)
+    monkeypatch.setattr(celery.conf, "task_always_eager", True)
+    mock_responses.add(
+        responses.GET,
+        re.compile(r"https://dummyjson\.com/users\?.*$"),
+        json={
+            "users": [
+                {
+                    "id": 150,
+                    "firstName": "Fresh",
+                    "bank": {"cardType": "Visa", "cardNumber": "4111", "cardExpire": "01/30"},
+                }
+            ],
+            "total": 1,
+        },
+        status=200,
+    )
+    mock_responses.add(
+        responses.GET,
+        re.compile(r"https://dummyjson\.com/users/150(\?.*)?$"),
+        json={"id": 150, "address": {"address": "150 Fresh Ln", "city": "Newtown"}},
+        status=200,
+    )
+
+    result = sync_users()
+
+    assert result["inserted"] == 1
+    assert result["enrich_queued"] == 1  # the card came with the page, only the address is queued
+    user = db_session.query(User).filter_by(external_id=150).one()
+    assert db_session.query(Address).filter_by(user_id=user.id).one().city == "Newtown"
+    assert db_session.query(CreditCard).filter_by(user_id=user.id).one().cc_type == "Visa"
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_sync_users_task_resumes_from_checkpoint(db_session, mock_responses, monkeypatch):
+    """A retry of the same run should only fetch pages after the last committed one."""
+    from requests import RequestException
+
+    from app.models import SyncCheckpoint
+    from app.settings import get_settings
+
+    monkeypatch.setattr(get_settings(), "users_page_size", 1)
+
+    def page(skip, status=200):
+        mock_responses.add(
+            responses.GET,
+            "https://dummyjson.com/users",
+            match=[
+                responses.matchers.query_param_matcher(
+                    {"limit": "1", "skip": str(skip)}, strict_match=False
+                )
+            ],
+            json={"users": [{"id": 320 + skip, "firstName": f"R{skip}"}], "total": 2},
+            status=status,
+        )
+
+    page(0)
+    page(1, status=503)
+    with pytest.raises(RequestException):
+        sync_users()
+
+    checkpoint = db_session.query(SyncCheckpoint).one()
+    assert checkpoint.skip == 1
+
+    mock_responses.reset()
+    page(1)
+    result = sync_users.apply(task_id=checkpoint.run_id).get()
+
+    assert result["resumed_from"] == 1
+    assert result["synced"] == 1
+    assert [c.request.params["skip"] for c in mock_responses.calls] == ["1"]
+    assert db_session.query(SyncCheckpoint).count() == 0
+    assert db_session.query(User).filter(User.external_id.in_([320, 321])).count() == 2
+
+
+@pytest.mark.usefixtures("mock_responses")
+def test_enrichment_isolates_failing_users_and_dead_letters_them(
+    db_session, mock_responses, monkeypatch
+):
+    """
+    One failing user should not abort the batch and is excluded after repeated failures.
+
+    Transient errors (503) are retried; a 404 is permanent and recorded at once.
+    """
+    from app.models import EnrichmentFailure
+    from app.settings import get_settings
+
+    monkeypatch.setattr(get_settings(), "enrich_item_retries", 1)
+    monkeypatch.setattr(get_settings(), "enrich_item_backoff", 0)
+    monkeypatch.setattr(get_settings(), "enrich_max_failures", 1)
+    db_session.query(Address).delete()
+    db_session.query(User).delete()
+    db_session.commit()
+
+    good, bad = User(external_id=110, name="Good"), User(external_id=111, name="Bad")
+    flaky = User(external_id=112, name="Flaky")
+    db_session.add_all([good, bad, flaky])
+    db_session.commit()
+
+    mock_responses.add(
+        responses.GET,
+        re.compile(r"https://dummyjson\.com/users/110(\?.*)?$"),
+        json={"id": 110, "address": {"address": "110 Good St", "city": "Fine"}},
+        status=200,
+    )
+    mock_responses.add(
+        responses.GET,
+        re.compile(r"https://dummyjson\.com/users/111(\?.*)?$"),
+        json={"message": "User with id '111' not found"},
+        status=404,
+    )
+    flaky_url = re.compile(r"https://dummyjson\.com/users/112(\?.*)?$")
+    mock_responses.add(responses.GET, flaky_url, json={"message": "busy"}, status=503)
+    mock_responses.add(
+        responses.GET,
+        flaky_url,
+        json={"id": 112, "address": {"address": "112 Flaky St", "city": "Later"}},
+        status=200,
+    )
+
+    result = enrich_missing_addresses(batch_size=10)
+
+    assert (result["updated"], result["failed"]) == (2, 1)
+    assert len(mock_responses.calls) == 4  # the 503 was retried once, the 404 not at all
+    assert db_session.query(Address).filter_by(user_id=flaky.id).one().city == "Later"
+    assert db_session.query(Address).filter_by(user_id=good.id).one().city == "Fine"
+    failure = db_session.query(EnrichmentFailure).filter_by(user_id=bad.id).one()
+    assert (failure.kind, failure.failures) == ("addresses", 1)
+    assert "404" in failure.last_error
+
+    db_session.query(User).filter_by(id=bad.id).update({"address_claimed_until": None})
+    db_session.commit()
+    assert (
+        claim_users_missing(
+            Address, "address_claimed_until", limit=10, lease_seconds=60, max_failures=1
+        )
+        == []
+    )
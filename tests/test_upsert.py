@@ -25,3 +25,47 @@ def test_user_upsert_idempotent(db_session):
     assert all_users[0].name == "Test User Updated"
     assert all_users[0].username == "test2"
     assert all_users[0].email == "t2@t.com"
+
+
+def test_bulk_upsert_inserts_and_updates_in_one_statement(db_session):
+    """bulk_upsert should insert new rows, update existing ones and collapse duplicate keys."""
+    from app.db import bulk_upsert
+
+    db_session.add(User(external_id=201, name="Old Name"))
+    db_session.commit()
+
+    rows = [
+        {"external_id": 201, "name": "New Name", "email": "a@a.com"},
+        {"external_id": 202, "name": "Second", "email": "b@b.com"},
+        {"external_id": 202, "name": "Second Dup", "email": "b2@b.com"},
+    ]
+    written = bulk_upsert(db_session, User, rows, conflict_cols=["external_id"], chunk_size=1)
+    db_session.commit()
+    db_session.expire_all()
+
+    assert written == 2
+    saved = {
+        u.external_id: u for u in db_session.query(User).filter(User.external_id.in_([201, 202]))
+    }
+    assert set(saved) == {201, 202}
+    assert saved[201].name == "New Name"
+    assert saved[202].email == "b2@b.com"
+
+
+def test_async_database_url_swaps_driver():
+    """The API's async engine reuses DATABASE_URL with an asyncio driver unless overridden."""
+    from app.db import async_database_url
+    from app.settings import get_settings
+
+    def url_for(database_url, override=None):
+        url = async_database_url(
+            get_settings().model_copy(
+                update={"database_url": database_url, "async_database_url": override}
+            )
+        )
+        return url.drivername, url.database
+
+    assert url_for("postgresql+psycopg2://app:pw@db:5432/app") == ("postgresql+asyncpg", "app")
+    assert url_for("postgresql+psycopg://app:pw@db/app") == ("postgresql+psycopg", "app")
+    assert url_for("sqlite+pysqlite:///:memory:") == ("sqlite+aiosqlite", ":memory:")
+    assert url_for("sqlite:///x.db", "sqlite+aiosqlite:///y.db") == ("sqlite+aiosqlite", "y.db")